@@ -0,0 +1,133 @@
+"""
+Timing and allocation measurement shared by the benchmarks.
+
+Works under CPython and the MicroPython unix port. Under CPython the MicroPython
+modules come from sim/ (see sim/run.py); gc.collect() becomes a counter there,
+so numbers that include collections are only meaningful on MicroPython.
+
+Allocation figures differ by interpreter:
+    MicroPython: bytes allocated per op, measured with the GC disabled so
+        gc.mem_alloc() only grows.
+    CPython: transient tracemalloc peak per op, i.e. the most the op had
+        allocated at once.
+"""
+import gc
+import sys
+import time
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+if MICROPYTHON:
+    def _now_us():
+        return time.ticks_us()
+
+    def _elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    import tracemalloc
+
+    _perf_counter_ns = time.perf_counter_ns
+
+    def _now_us():
+        return _perf_counter_ns() // 1000
+
+    def _elapsed_us(start):
+        return _perf_counter_ns() // 1000 - start
+
+
+def setup_paths():
+    """Make iwp/ importable and, on CPython, the simulated MicroPython modules.
+
+    Like the other benchmarks this expects to be run from the repository root.
+    """
+    if MICROPYTHON:
+        sys.path.insert(0, "iwp")
+    else:
+        sys.path.insert(0, "sim")
+        from run import install
+        install()
+
+
+def measure(fn, ops_per_call=1, min_time_us=200000, max_calls=100000):
+    """Time fn and measure its allocations.
+
+    Args:
+        fn: Callable taking no arguments, doing ops_per_call operations.
+        ops_per_call (int): How many operations one call counts as.
+        min_time_us (int): Keep calling until at least this much time has passed.
+
+    Returns:
+        dict: ops_per_sec, us_per_op, alloc_bytes_per_op, peak_heap_bytes, calls.
+    """
+    fn()  # Warm up caches and lazy tables
+
+    calls = 0
+    start = _now_us()
+    elapsed = 0
+    while elapsed < min_time_us and calls < max_calls:
+        fn()
+        calls += 1
+        elapsed = _elapsed_us(start)
+    ops = calls * ops_per_call
+    result = {
+        "calls": calls,
+        "ops_per_sec": ops * 1000000 / max(elapsed, 1),
+        "us_per_op": elapsed / max(ops, 1),
+    }
+    result.update(_allocations(fn, ops_per_call))
+    return result
+
+
+def _allocations(fn, ops_per_call, calls=20):
+    if MICROPYTHON:
+        gc.collect()
+        base = gc.mem_alloc()
+        gc.disable()
+        try:
+            for _ in range(calls):
+                fn()
+            allocated = gc.mem_alloc() - base
+        finally:
+            gc.enable()
+        gc.collect()
+        return {
+            "alloc_bytes_per_op": allocated / (calls * ops_per_call),
+            "peak_heap_bytes": base + allocated,
+        }
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    if not tracing:
+        tracemalloc.stop()
+    return {
+        "alloc_bytes_per_op": (peak - base) / ops_per_call,
+        "peak_heap_bytes": peak,
+    }
+
+
+def runs_heap_locked(fn):
+    """Whether fn runs with the heap locked, which proves it allocated nothing.
+
+    Only MicroPython can lock the heap; under CPython this returns None.
+    """
+    if not MICROPYTHON:
+        return None
+    import micropython
+    fn()  # Lazy tables and caches are allowed to allocate once
+    micropython.heap_lock()
+    try:
+        fn()
+    except MemoryError:
+        return False
+    finally:
+        micropython.heap_unlock()
+    return True
+
+
+def interpreter():
+    return "{} {}".format(sys.implementation.name, sys.version.split()[0])
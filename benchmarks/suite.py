@@ -0,0 +1,584 @@
+"""
+Micro-benchmarks for the firmware hot paths, across subsystems.
+
+Each benchmark reports operations per second, microseconds per operation,
+allocations per operation and peak heap (see harness.py for how allocations
+are counted on each interpreter). Results can be saved as a JSON baseline and
+compared against a later run, e.g. before and after a commit:
+
+    python3 benchmarks/suite.py --json baseline.json
+    git checkout <other commit>
+    python3 benchmarks/suite.py --compare baseline.json
+
+Options:
+    --json FILE       Write the results to FILE
+    --compare FILE    Compare against a baseline written with --json. Exits 1 if
+                      any benchmark is slower or allocates more than --threshold
+    --threshold PCT   Allowed regression in percent (default 15)
+    --only NAME       Run only benchmarks whose name contains NAME
+    --time MS         Minimum time per benchmark (default 200)
+
+Runs under CPython (using the stand-in modules in sim/) and the MicroPython
+unix port. Benchmarks whose modules cannot be imported are reported as skipped.
+
+On MicroPython the benchmarks in ALLOCATION_FREE are also run once with the heap
+locked (micropython.heap_lock), so any allocation raises MemoryError; the run
+exits 1 if one of them allocated. CPython cannot lock its heap, so there they
+are only measured like the rest.
+"""
+import json
+import sys
+try:
+    import os
+except ImportError:
+    import uos as os
+
+import harness
+
+harness.setup_paths()
+
+BANNER = "DEF CON 32"
+
+# Paths that must not allocate at all: the matrix frame from the timer job to
+# the I2C write. The ring tick is not in here, its frame copy slices memoryviews.
+ALLOCATION_FREE = ("display_tick",)
+
+# Frames spread over the matrix, including the two extra LEDs (bits 42 and 43)
+FRAMES = (0x0, 0xFFFFFFFFFFF, 0x02082082087, 0x21084210841, 0x30C30C30C30)
+
+# PUBLISH to the banner topic, as the broker sends it
+MQTT_TOPIC = b"badge/banner"
+MQTT_MESSAGE = b"HELLO DEF CON 32"
+
+
+class NullI2C:
+    """Accepts and discards every transfer, so only the driver's own work is timed."""
+
+    def writeto(self, address, buf, stop=True):
+        pass
+
+    def writeto_mem(self, address, reg, buf):
+        pass
+
+    def readfrom_mem(self, address, reg, n):
+        return bytes(n)
+
+
+class NullTimer:
+    """Takes the player's re-arms without scheduling anything."""
+
+    def init(self, mode=None, period=-1, freq=-1, callback=None):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class ReplaySocket:
+    """Serves the same packet over and over to MQTTClient.wait_msg."""
+
+    def __init__(self, packet):
+        self.packet = packet
+        self.pos = 0
+
+    def rewind(self):
+        self.pos = 0
+
+    def read(self, n):
+        start = self.pos
+        self.pos = start + n
+        return self.packet[start:self.pos]
+
+    def write(self, buf):
+        return len(buf)
+
+    def setblocking(self, flag):
+        pass
+
+
+def _mqtt_publish_packet(topic, msg):
+    body = bytes((len(topic) >> 8, len(topic) & 0xFF)) + topic + msg
+    return bytes((0x30, len(body))) + body
+
+
+def _matrix_manager():
+    from src.state_manager import StateManager
+    from src.matrix_functions.matrix_manager import MatrixManager
+    return MatrixManager(StateManager(), NullI2C())
+
+
+def bench_scroll_text_frames():
+    """scroll_text_frames, per character of the banner."""
+    matrix_manager = _matrix_manager()
+
+    def run():
+        for _ in matrix_manager.scroll_text_frames(BANNER, delay=0.05):
+            pass
+    return run, len(BANNER)
+
+
+def bench_banner_source():
+    """BannerSource rendering the same banner a ring at a time, per frame."""
+    from src.banner_source import BannerSource
+    banner = BannerSource(_matrix_manager(), BANNER, delay=0.05)
+    ring = banner.frame_store
+    count = ring.size - 1
+
+    def run():
+        for _ in range(count):
+            banner.next_frame()
+        banner.fill()
+    return run, count
+
+
+def bench_animation_file():
+    """AnimationFileSource reading a looping banner from a file, per frame."""
+    from src.animation_file import AnimationFileSource, write_animation
+    from src.frame_store import steps_in_ms
+    path = "bench_suite.anim"
+    write_animation(path, steps_in_ms(_matrix_manager().scroll_text_frames(BANNER, delay=0.05)))
+    source = AnimationFileSource(path)
+    # The open file keeps reading after the name is gone
+    os.remove(path)
+    count = source.frame_store.size - 1
+
+    def run():
+        for _ in range(count):
+            source.next_frame()
+        source.fill()
+    return run, count
+
+
+def bench_add_frame():
+    """StateManager.add_frame re-sending the same banner (cache hits), per frame."""
+    from src.frame_store import steps_in_ms
+    from src.state_manager import StateManager
+    frames = list(steps_in_ms(_matrix_manager().scroll_text_frames(BANNER, delay=0.05)))
+    state_manager = StateManager()
+
+    def run():
+        state_manager.begin_frames()
+        for frame, delay_ms in frames:
+            state_manager.add_frame(frame, delay_ms)
+        state_manager.publish_frames()
+    return run, len(frames)
+
+
+def bench_frame_store_acquire():
+    """FrameStore.acquire of a new banner into an empty store, per frame."""
+    from src.frame_store import FrameStore
+    frames = [frame for frame, _ in _matrix_manager().scroll_text_frames(BANNER, delay=0.05)]
+
+    def run():
+        store = FrameStore()
+        for frame in frames:
+            store.acquire(frame)
+    return run, len(frames)
+
+
+def bench_get_current_frame():
+    """StateManager.get_current_frame over a published playlist, per frame."""
+    from src.frame_store import steps_in_ms
+    from src.state_manager import StateManager
+    state_manager = StateManager()
+    state_manager.begin_frames()
+    for frame, delay_ms in steps_in_ms(_matrix_manager().scroll_text_frames(BANNER, delay=0.05)):
+        state_manager.add_frame(frame, delay_ms)
+    state_manager.publish_frames()
+    count = 100
+
+    def run():
+        get_current_frame = state_manager.get_current_frame
+        for _ in range(count):
+            get_current_frame()
+    return run, count
+
+
+def bench_next_frame():
+    """StateManager.next_frame over a published playlist, per frame."""
+    from src.frame_store import steps_in_ms
+    from src.state_manager import StateManager
+    state_manager = StateManager()
+    state_manager.begin_frames()
+    for frame, delay_ms in steps_in_ms(_matrix_manager().scroll_text_frames(BANNER, delay=0.05)):
+        state_manager.add_frame(frame, delay_ms)
+    state_manager.publish_frames()
+    count = 100
+
+    def run():
+        next_frame = state_manager.next_frame
+        for _ in range(count):
+            next_frame()
+    return run, count
+
+
+def bench_registry_switch():
+    """AnimationRegistry.play between two cached animations, per switch."""
+    from src.animation_registry import AnimationRegistry
+    from src.animations import AnimationManager
+    from src.state_manager import StateManager
+    state_manager = StateManager()
+    registry = AnimationRegistry(state_manager, AnimationManager())
+    registry.register_all()
+    for name in ("heart", "cat"):
+        registry.play(name)
+        state_manager.next_frame()
+
+    def run():
+        play = registry.play
+        next_frame = state_manager.next_frame
+        for _ in range(50):
+            play("heart")
+            next_frame()
+            play("cat")
+            next_frame()
+    return run, 100
+
+
+def bench_display_tick():
+    """One FramePlayer frame through the I2C bus queue: next_frame, decode, render, re-arm."""
+    from src.frame_store import steps_in_ms
+    from src.i2c_bus import I2CBus, PRIORITY_DISPLAY
+    from src.playback import FramePlayer, LATE_MS
+    from src.state_manager import StateManager
+    from src.matrix_functions.matrix_manager import MatrixManager
+    state_manager = StateManager()
+    bus = I2CBus(NullI2C())
+    matrix_manager = MatrixManager(state_manager, bus)
+    state_manager.begin_frames()
+    for frame, delay_ms in steps_in_ms(matrix_manager.scroll_text_frames(BANNER, delay=0.05)):
+        state_manager.add_frame(frame, delay_ms)
+    state_manager.publish_frames()
+    player = FramePlayer(state_manager, matrix_manager.led_matrix, NullTimer(),
+                         run=lambda job: bus.submit(job, PRIORITY_DISPLAY, LATE_MS))
+    player.running = True
+    show = player._show_next_cb
+    run = player._run
+
+    def tick():
+        for _ in range(20):
+            run(show)
+    return tick, 20
+
+
+def bench_set_frame():
+    """IS31FL3729.set_frame and render_led_map, per frame."""
+    led_matrix = _matrix_manager().led_matrix
+
+    def run():
+        for frame in FRAMES:
+            led_matrix.set_frame(frame, 255)
+            led_matrix.render_led_map()
+    return run, len(FRAMES)
+
+
+def _three_pass(led_matrix, frame, max_brightness):
+    # The decode set_frame replaced: the frame int expanded into (x, y,
+    # brightness) tuples, copied again with the brightness applied, then each
+    # looked up in led_matrix_map
+    led_list = []
+    for x in range(7):
+        for y in range(6):
+            brightness = 255 if frame & (1 << (x * 6 + y)) else 0
+            led_list.append((x, y, brightness))
+    new_led_list = []
+    for x, y, brightness in led_list:
+        if brightness > 0:
+            new_led_list.append((x, y, max_brightness))
+        else:
+            new_led_list.append((x, y, brightness))
+    pwm = led_matrix.led_brightness_map
+    for x, y, brightness in new_led_list:
+        pwm[led_matrix.led_matrix_map[(x, y)]] = min(brightness, led_matrix.max_brightness)
+    led_matrix.render_led_map()
+
+
+def bench_three_pass():
+    """The three-pass frame decode set_frame replaced, per frame, for comparison with matrix_set_frame."""
+    led_matrix = _matrix_manager().led_matrix
+    reference = _matrix_manager().led_matrix
+    # Only the 42 grid LEDs, the old decode never reached the two extras
+    frames = [frame & 0x3FFFFFFFFFF for frame in FRAMES]
+    for frame in frames:
+        _three_pass(led_matrix, frame, 255)
+        reference.set_frame(frame, 255)
+        if bytes(led_matrix.led_brightness_map) != bytes(reference.led_brightness_map):
+            raise AssertionError("set_frame and the three-pass decode differ for {:#x}".format(frame))
+
+    def run():
+        for frame in frames:
+            _three_pass(led_matrix, frame, 255)
+    return run, len(frames)
+
+
+def bench_set_grey_frame():
+    """IS31FL3729.set_grey_frame_bytes and render_led_map for spiral_and_wipe, per frame."""
+    from src.animations import AnimationManager
+    led_matrix = _matrix_manager().led_matrix
+    animation_manager = AnimationManager()
+    frames = [frame for frame, _ in animation_manager.to_grey_frames(animation_manager.spiral_and_wipe())]
+
+    def run():
+        for frame in frames:
+            led_matrix.set_grey_frame_bytes(frame)
+    return run, len(frames)
+
+
+def bench_set_led_list():
+    """IS31FL3729.set_led_list with convert_to_matrix_map output, per frame."""
+    from src.animations import AnimationManager
+    led_matrix = _matrix_manager().led_matrix
+    frames = AnimationManager().convert_to_matrix_map(AnimationManager().heart)
+
+    def run():
+        for led_list, _ in frames:
+            led_matrix.set_led_list(led_list)
+            led_matrix.render_led_map()
+    return run, len(frames)
+
+
+def bench_generate_frame():
+    """LEDController.generate_frame (a palette row rotated into the NeoPixel buffer), per frame."""
+    from src.led_controller import LEDController
+    led_controller = LEDController(36, 25, 255, 0.02, 180)
+    led_controller.num_leds_lit = 36
+    led_controller.palette.build(led_controller.brightness_table, 36)
+
+    def run():
+        led_controller.update_position()
+        led_controller.cycle = (led_controller.cycle + 1) % led_controller.max_color_cycle
+        led_controller.generate_frame()
+    return run, 1
+
+
+def bench_generate_frame_hsv():
+    """The ring frame as generate_frame made it before the palette: hsv_to_rgb per lit pixel."""
+    from src.helpers import hsv_to_rgb
+    from src.led_controller import LEDController
+    led_controller = LEDController(36, 25, 255, 0.02, 180)
+    led_controller.num_leds_lit = 36
+    np = led_controller.np
+
+    def run():
+        led_controller.cycle = (led_controller.cycle + 1) % led_controller.max_color_cycle
+        np.fill((0, 0, 0))
+        lut = led_controller.brightness_table.table
+        base_hue = (led_controller.cycle / led_controller.max_color_cycle) % 1
+        for offset in range(led_controller.num_leds_lit):
+            r, g, b = hsv_to_rgb((base_hue + offset * led_controller.hue_increment) % 1, 1, 1)
+            np[(led_controller.position + offset) % led_controller.num_pixels] = (lut[r], lut[g], lut[b])
+    return run, 1
+
+
+def bench_palette_build():
+    """RainbowPalette working out every row, per row (what a brightness fade costs per frame)."""
+    from src.brightness import BrightnessTable
+    from src.palette import RainbowPalette
+    palette = RainbowPalette(36, 0.02, 180)
+    brightness_table = BrightnessTable(128)
+
+    def run():
+        palette.hue_increment = None
+        palette.rebuild(0.02, 180)
+        palette.build(brightness_table, 24)
+    return run, 180
+
+
+def ring_effect_bench(name):
+    """Setup for timing RingEffects drawing effect name into the ring buffer, brightness included, per frame."""
+    def setup():
+        from src.led_controller import LEDController
+        from src.ring_effects import RingEffects
+        led_controller = LEDController(36, 25, 255, 0.02, 180)
+        ring_effects = RingEffects(led_controller)
+        ring_effects.set_rssi(-60)
+        ring_effects.select(name)
+        buf = led_controller.np.buf
+
+        def run():
+            if not ring_effects.tick % 8:
+                ring_effects.beat()
+            ring_effects.render(buf)
+        return run, 1
+    return setup
+
+
+def bench_hsv_float():
+    """helpers.hsv_to_rgb across the wheel, per colour."""
+    from src.helpers import hsv_to_rgb
+    count = 96
+
+    def run():
+        for i in range(count):
+            hsv_to_rgb(i / count, 1.0, 0.5)
+    return run, count
+
+
+def bench_hsv_fill():
+    """helpers.hsv_fill across the wheel into a buffer, per colour."""
+    from src.helpers import HUE_RANGE, hsv_fill
+    count = 96
+    buf = bytearray(count * 3)
+
+    def run():
+        hsv_fill(buf, 0, count, 0, HUE_RANGE // count, 255, 128)
+    return run, count
+
+
+def bench_conway():
+    """Conway's game, per generation on the 7x6 grid."""
+    from examples.conways_game import conway_game_init, conway_game_next_frame
+    grid = [conway_game_init(7, 6)]
+
+    def run():
+        frame, grid[0] = conway_game_next_frame(grid[0], 7, 6)
+    return run, 1
+
+
+def bench_convert_to_matrix_map():
+    """AnimationManager.convert_to_matrix_map, per frame."""
+    from src.animations import AnimationManager
+    animation_manager = AnimationManager()
+    frames = animation_manager.wave
+
+    def run():
+        animation_manager.convert_to_matrix_map(frames)
+    return run, len(frames)
+
+
+def bench_mqtt_wait_msg():
+    """MQTTClient.wait_msg parsing one PUBLISH, per message."""
+    from lib.custom_mqtt import MQTTClient
+    client = MQTTClient("bench", "localhost")
+    sock = ReplaySocket(_mqtt_publish_packet(MQTT_TOPIC, MQTT_MESSAGE))
+    client.sock = sock
+    client.set_callback(lambda topic, msg: None)
+
+    def run():
+        sock.rewind()
+        client.wait_msg()
+    return run, 1
+
+
+BENCHMARKS = (
+    ("scroll_text_frames", bench_scroll_text_frames),
+    ("banner_source_render", bench_banner_source),
+    ("animation_file_read", bench_animation_file),
+    ("state_add_frame", bench_add_frame),
+    ("frame_store_acquire", bench_frame_store_acquire),
+    ("state_get_current_frame", bench_get_current_frame),
+    ("state_next_frame", bench_next_frame),
+    ("registry_switch", bench_registry_switch),
+    ("display_tick", bench_display_tick),
+    ("matrix_set_frame", bench_set_frame),
+    ("matrix_three_pass", bench_three_pass),
+    ("matrix_set_grey_frame", bench_set_grey_frame),
+    ("matrix_set_led_list", bench_set_led_list),
+    ("ring_generate_frame", bench_generate_frame),
+    ("ring_generate_frame_hsv", bench_generate_frame_hsv),
+    ("ring_palette_build", bench_palette_build),
+    ("ring_effect_comet", ring_effect_bench("comet")),
+    ("ring_effect_sparkle", ring_effect_bench("sparkle")),
+    ("ring_effect_breathing", ring_effect_bench("breathing")),
+    ("ring_effect_vu", ring_effect_bench("vu")),
+    ("ring_effect_wifi", ring_effect_bench("wifi")),
+    ("hsv_float", bench_hsv_float),
+    ("hsv_fill", bench_hsv_fill),
+    ("conway_generation", bench_conway),
+    ("convert_to_matrix_map", bench_convert_to_matrix_map),
+    ("mqtt_wait_msg", bench_mqtt_wait_msg),
+)
+
+
+def run_all(only=None, min_time_us=200000):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if only and only not in name:
+            continue
+        try:
+            fn, ops_per_call = setup()
+        except ImportError as e:
+            print("{:<26} skipped ({})".format(name, e))
+            continue
+        result = harness.measure(fn, ops_per_call, min_time_us)
+        results[name] = result
+        print("{:<26} {:>12.1f} ops/s {:>10.2f} us/op {:>10.1f} B/op {:>9} B peak".format(
+            name, result["ops_per_sec"], result["us_per_op"],
+            result["alloc_bytes_per_op"], result["peak_heap_bytes"]))
+        if name in ALLOCATION_FREE:
+            locked = harness.runs_heap_locked(fn)
+            if locked is not None:
+                result["heap_locked"] = locked
+                print("{:<26} {}".format("", "runs with the heap locked" if locked else "ALLOCATES with the heap locked"))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change against baseline and return the names that regressed."""
+    if baseline.get("interpreter") != harness.interpreter():
+        print("Note: baseline was recorded with {}".format(baseline.get("interpreter")))
+    print()
+    print("{:<26} {:>10} {:>10}".format("change vs baseline", "time", "alloc"))
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print("{:<26} {:>10} {:>10}".format(name, "new", "new"))
+            continue
+        time_pct = _percent(result["us_per_op"], before["us_per_op"])
+        alloc_pct = _percent(result["alloc_bytes_per_op"], before["alloc_bytes_per_op"])
+        flag = ""
+        if time_pct > threshold or alloc_pct > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<26} {:>+9.1f}% {:>+9.1f}%{}".format(name, time_pct, alloc_pct, flag))
+    return regressions
+
+
+def _percent(after, before):
+    if before == 0:
+        return 0.0 if after == 0 else 100.0
+    return (after - before) * 100 / before
+
+
+def _parse_args(argv):
+    # MicroPython has no argparse
+    options = {"json": None, "compare": None, "threshold": 15.0, "only": None, "time": 200}
+    i = 0
+    while i < len(argv):
+        key = argv[i].lstrip("-")
+        if key not in options or i + 1 >= len(argv):
+            print(__doc__)
+            sys.exit(2)
+        options[key] = argv[i + 1]
+        i += 2
+    options["threshold"] = float(options["threshold"])
+    options["time"] = int(options["time"])
+    return options
+
+
+def main(argv):
+    options = _parse_args(argv)
+    print(harness.interpreter())
+    results = run_all(options["only"], options["time"] * 1000)
+    allocating = [name for name, result in results.items() if result.get("heap_locked") is False]
+
+    if options["json"]:
+        with open(options["json"], "w") as f:
+            json.dump({"interpreter": harness.interpreter(), "results": results}, f)
+        print("Wrote", options["json"])
+
+    if options["compare"]:
+        with open(options["compare"]) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options["threshold"])
+        if regressions:
+            print("Regressed by more than {}%: {}".format(options["threshold"], ", ".join(regressions)))
+            sys.exit(1)
+    if allocating:
+        print("Allocated with the heap locked: {}".format(", ".join(allocating)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
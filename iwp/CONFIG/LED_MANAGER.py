@@ -6,7 +6,15 @@ WS_PWR_PIN = 18
 # There are a lot of ways in the code to adjust brightness, this is the most basic way. Dive in to learn more. 
 MAX_BRIGHTNESS = 100
 
+# Gamma used to make low brightness levels look smooth. 1.0 is linear
+BRIGHTNESS_GAMMA = 2.2
+
 # Change this to vary the spread of your rainbow
 HUE_INCREMENT = 20.0 / 360
 
 MAX_COLOR_CYCLE = 100
+
+# Bytes the matrix frame cache may use. A long banner that does not fit is cut short
+FRAME_CACHE_BUDGET = 16 * 1024
+# Same for greyscale frames (22 bytes each instead of 8)
+GREY_FRAME_CACHE_BUDGET = 8 * 1024
@@ -34,6 +34,12 @@ Driver for the IS31FL3729 LED driver chip using I2C communication.
            Once mapped you can hard-code the map in your setup as to avoid doing this each time you
            set it up
 
+        The brightness of every PWM register lives in a preallocated bytearray.
+        led_brightness_map is a memoryview over it, so led_brightness_map[reg] = value
+        still works. On a flush each value is passed through the brightness table
+        (if one is set) into a second buffer (register 0 prefix + 48 PWM bytes),
+        and a full-frame flush hands that buffer to i2c.writeto without allocating.
+
         5. Set the brightness of a specific LED by its register:
             led_driver.set_led(0x01, 128)  # Set LED at register 0x01 to half brightness
 
@@ -44,7 +50,18 @@ Driver for the IS31FL3729 LED driver chip using I2C communication.
             led_list = [(0, 1, 255), (1, 2, 128), (2, 3, 64)]
             led_driver.set_led_list(led_list)
 
-        8. Clear the LED matrix (turn off all LEDs):
+        8. Compile the coordinate map once the rows and cols are set, then draw a
+           whole frame straight from an int where bit x * cols + y is the LED at (x, y):
+            led_driver.compile_led_matrix_map()
+            led_driver.set_frame(0b111111, 255)  # Light the first row
+
+        9. Draw a greyscale frame, 4 bits per LED (LED i in the low nibble of byte
+           i // 2 when i is even, the high nibble when odd), through a 16-entry
+           level table:
+            led_driver.set_grey_levels(bytes(range(0, 256, 17)))
+            led_driver.set_grey_frame_bytes(b"\x0f\xf0" + bytes(20))
+
+        10. Clear the LED matrix (turn off all LEDs):
             led_driver.clear_matrix()
 
     Methods:
@@ -52,15 +69,57 @@ Driver for the IS31FL3729 LED driver chip using I2C communication.
         start_display(): Initialize and start the display after setting things up.
         set_led_raw(reg, brightness): Set the brightness of an LED using its register.
         map_leds(num_leds=45): Map LEDs to coordinates by prompting the user.
-        render_led_map(): Render the current LED brightness map to the display.
+        render_led_map(): Render the changed part of the LED brightness map to the display.
         set_led(reg, brightness): Set the brightness of an LED by its register.
         set_led_by_coord(x, y, brightness): Set the brightness of an LED using coordinates.
         set_led_list(led_list_x_y): Set the brightness of multiple LEDs using a list of coordinates and brightness values.
+        compile_led_matrix_map(): Build the flat index-to-register table from led_matrix_map.
+        set_frame(frame_int, brightness): Set every mapped LED from the bits of a frame int.
+        set_frame_bytes(frame_bytes, brightness, offset=0): Same as set_frame for a little-endian frame buffer.
+        set_grey_levels(levels): Set the 16 PWM levels greyscale frames are drawn with.
+        set_grey_frame_bytes(frame_bytes, offset=0): Set every mapped LED from a 4-bit-per-LED frame.
         clear_matrix(): Clear the LED matrix (turn off all LEDs).
-        set_max_brightness(max_brightness): Set the maximum brightness for all LEDs.
+        reset_brightness_map(): Set every PWM register in the frame buffer to 0 without rendering.
+        set_brightness(max_brightness): Set the maximum brightness for all LEDs.
+        set_brightness_table(brightness_table): Map every level through brightness_table.table on flush.
+        set_global_current(current): Scale the whole matrix with the global current register (0-64).
+        set_global_current_base(current): Set the resting global current, which brightness fades own.
+        fade_global_current(target, steps, start=None): Generator fading the global current, one write per step.
+        strobe_global_current(peak, steps): Generator fading the global current up to peak and back to 0.
+        set_cs_scaling(cs, scaling): Set the scaling register of one current source.
+        get_bus_stats(): Get the I2C byte/transaction counters for measuring bus usage.
+        reset_bus_stats(): Zero the I2C byte/transaction counters.
 """
 
 import time
+from array import array
+
+# PWM registers 0x00-0x2f hold the brightness of every LED on the badge
+PWM_REGISTERS = 0x30
+
+# The global current control register (0xA1) scales every LED at once, 0-64
+GLOBAL_CURRENT_MAX = 64
+
+# Changed registers closer together than this are sent in one burst, since
+# re-sending a couple of unchanged bytes is cheaper than a new START, address
+# and register byte.
+_BURST_MERGE_GAP = 2
+
+# Per-byte decode tables: the positions (0-7) of the set bits in byte value v
+# are _SET_BITS[_SET_BITS_START[v]:_SET_BITS_START[v + 1]]. Decoding a frame is
+# then a lookup per byte instead of a test per bit, and blank bytes cost nothing.
+def _build_set_bit_tables():
+    starts = array("H", [0] * 257)
+    bits = bytearray()
+    for value in range(256):
+        starts[value] = len(bits)
+        for bit in range(8):
+            if value & (1 << bit):
+                bits.append(bit)
+    starts[256] = len(bits)
+    return starts, bytes(bits)
+
+_SET_BITS_START, _SET_BITS = _build_set_bit_tables()
 
 class IS31FL3729:
     
@@ -69,26 +128,79 @@ class IS31FL3729:
         self.address = address
         
         self.led_matrix_map = {}
-        self.led_brightness_map = {}
+        # Flat copy of led_matrix_map indexed by x * cols + y, see compile_led_matrix_map
+        self.led_index_to_reg = b""
+
+        # Logical brightness of each PWM register, as set by the set_* methods
+        self._pwm = bytearray(PWM_REGISTERS)
+        self.led_brightness_map = memoryview(self._pwm)
+        # Object with a 256-entry .table applied on flush, see set_brightness_table
+        self.brightness_table = None
+
+        # Byte 0 is the start register for a full-frame write, the rest are the
+        # PWM registers in order. Nothing is allocated after this on a flush.
+        self._buf = bytearray(1 + PWM_REGISTERS)
+        self._buf_mv = memoryview(self._buf)
+        # Partial writes are copied to the front of _burst and sent through a
+        # view of their length. A view is made the first time a burst of that
+        # length goes out and kept, so after that no flush allocates
+        self._burst = bytearray(1 + PWM_REGISTERS)
+        self._burst_views = [None] * (2 + PWM_REGISTERS)
         
         self.cs_currents = cs_currents
         self.grid_size_mode = grid_size_mode
         self.max_brightness = 255  # Default maximum brightness
+        # PWM value for each of the 16 levels of a greyscale frame
+        self.grey_levels = bytearray(range(0, 256, 17))
+        self.global_current = GLOBAL_CURRENT_MAX
+        # Where the global current rests between effects, see set_global_current_base
+        self.global_current_base = GLOBAL_CURRENT_MAX
+        self._reg_buf = bytearray(2)  # Register + value for single register writes
         
         # Initialize the grid dimensions
         self.rows, self.cols = 0, 0
 
+        # Copy of the PWM registers as last written to the chip
+        self._shadow = bytearray(PWM_REGISTERS)
+        self._shadow_valid = False
+
+        # Bus usage counters
+        self.i2c_transactions = 0
+        self.i2c_bytes = 0
+        self.frames_flushed = 0
+        self.frames_skipped = 0
+
     def i2c_w(self, reg, data):
         buf = bytearray(1)
         buf[0] = reg
         buf.extend(bytearray(data))
+        self._write(buf)
+
+    def _write(self, buf):
         self.i2c.writeto(self.address, buf)
+        self.i2c_transactions += 1
+        self.i2c_bytes += len(buf) + 1  # Payload plus the address byte
+
+    def get_bus_stats(self):
+        return {
+            "transactions": self.i2c_transactions,
+            "bytes": self.i2c_bytes,
+            "frames_flushed": self.frames_flushed,
+            "frames_skipped": self.frames_skipped,
+        }
+
+    def reset_bus_stats(self):
+        self.i2c_transactions = 0
+        self.i2c_bytes = 0
+        self.frames_flushed = 0
+        self.frames_skipped = 0
 
     def start_display(self):
         # Reset all registers
         self.i2c_w(0xcf, [0xae])
+        self._shadow_valid = False
         # Set current limit to 16/64
-        self.i2c_w(0xa1, [64])
+        self.i2c_w(0xa1, [self.global_current])
         # Set each current source current
         self.i2c_w(0x90, bytearray(self.cs_currents))
         
@@ -116,38 +228,257 @@ class IS31FL3729:
         for key, value in sorted(self.led_matrix_map.items()):
             print(f"{key}: {hex(value)}")
 
+    def compile_led_matrix_map(self):
+        """Compile led_matrix_map into the flat led_index_to_reg table.
+
+        The LED at (x, y) lands at index x * cols + y, which is also its bit in
+        a frame int. LEDs outside the grid (y >= cols) follow the grid in
+        sorted order.
+        """
+        grid_size = self.rows * self.cols
+        extras = sorted(coord for coord in self.led_matrix_map if coord[1] >= self.cols)
+        table = bytearray(grid_size + len(extras))
+        for (x, y), reg in self.led_matrix_map.items():
+            if y < self.cols:
+                table[x * self.cols + y] = reg
+        for i, coord in enumerate(extras):
+            table[grid_size + i] = self.led_matrix_map[coord]
+        self.led_index_to_reg = bytes(table)
+
     def render_led_map(self):
-        led_brightness_list = []
-        for i, item in enumerate(self.led_brightness_map):
-            brightness_value = min(self.led_brightness_map[item], self.max_brightness)
-            led_brightness_list.append(brightness_value)
-        length_of_list = len(led_brightness_list)
-        self.i2c_w(0x00, led_brightness_list)
+        """Write the PWM registers that changed since the last render.
+
+        Changed registers are grouped into as few auto-increment bursts as
+        possible. If nothing changed the I2C transaction is skipped entirely,
+        and a frame where everything changed goes out as one write of the
+        preallocated buffer.
+        """
+        buf = self._buf
+        pwm = self._pwm
+        if self.brightness_table is None:
+            for reg in range(PWM_REGISTERS):
+                buf[reg + 1] = pwm[reg]
+        else:
+            lut = self.brightness_table.table
+            for reg in range(PWM_REGISTERS):
+                buf[reg + 1] = lut[pwm[reg]]
+
+        shadow = self._shadow
+        full = not self._shadow_valid
+        start = -1
+        end = -1
+        bursts = 0
+        for reg in range(PWM_REGISTERS):
+            if full or buf[reg + 1] != shadow[reg]:
+                if start >= 0 and reg - end > _BURST_MERGE_GAP + 1:
+                    self._write_burst(start, end)
+                    bursts += 1
+                    start = -1
+                if start < 0:
+                    start = reg
+                end = reg
+        if start >= 0:
+            self._write_burst(start, end)
+            bursts += 1
+
+        self._shadow_valid = True
+        if bursts:
+            self.frames_flushed += 1
+        else:
+            self.frames_skipped += 1
+
+    def _write_burst(self, start, end):
+        buf = self._buf
+        if start == 0 and end == PWM_REGISTERS - 1:
+            buf[0] = 0x00
+            self._write(self._buf_mv)
+        else:
+            length = end - start + 2
+            burst = self._burst
+            burst[0] = start
+            for i in range(1, length):
+                burst[i] = buf[start + i]
+            view = self._burst_views[length]
+            if view is None:
+                view = memoryview(burst)[:length]
+                self._burst_views[length] = view
+            self._write(view)
+        shadow = self._shadow
+        for reg in range(start, end + 1):
+            shadow[reg] = buf[reg + 1]
 
     def set_led(self, reg, brightness):
-        self.led_brightness_map[reg] = min(brightness, self.max_brightness)
+        self.led_brightness_map[reg] = min(int(brightness), self.max_brightness)
         self.render_led_map()
     
     def set_led_by_coord(self, x, y, brightness):
-        reg = hex(self.led_matrix_map[(x, y)])
-        self.led_brightness_map[reg] = min(brightness, self.max_brightness)
+        reg = self.led_matrix_map[(x, y)]
+        self.led_brightness_map[reg] = min(int(brightness), self.max_brightness)
         self.render_led_map()
         
     def set_led_list(self, led_list_x_y):
+        pwm = self.led_brightness_map
+        max_brightness = self.max_brightness
+        regs = self.led_index_to_reg
+        cols = self.cols
         for x, y, brightness in led_list_x_y:
-            reg = self.led_matrix_map[(x, y)]
-            self.led_brightness_map[reg] = min(brightness, self.max_brightness)
+            if regs and y < cols:
+                reg = regs[x * cols + y]
+            else:
+                reg = self.led_matrix_map[(x, y)]
+            pwm[reg] = min(int(brightness), max_brightness)
         self.render_led_map()
+
+    def set_frame(self, frame_int, brightness):
+        """Light the LEDs whose bit is set in frame_int at brightness, turn off the rest."""
+        self.set_frame_bytes(frame_int.to_bytes(8, "little"), brightness)
+
+    def set_frame_bytes(self, frame_bytes, brightness, offset=0):
+        """Decode a little-endian frame straight into the PWM buffer and render it.
+
+        Args:
+            frame_bytes: Buffer holding the frame, bit i of the frame is bit
+                i % 8 of byte offset + i // 8.
+            brightness (int): PWM value for lit LEDs.
+            offset (int): Where the frame starts in frame_bytes.
+        """
+        pwm = self.led_brightness_map
+        regs = self.led_index_to_reg
+        count = len(regs)
+        level = min(int(brightness), self.max_brightness)
+        for i in range(count):
+            pwm[regs[i]] = 0
+        starts = _SET_BITS_START
+        bits = _SET_BITS
+        base = 0
+        while base < count:
+            value = frame_bytes[offset]
+            if value:
+                for k in range(starts[value], starts[value + 1]):
+                    i = base + bits[k]
+                    if i < count:
+                        pwm[regs[i]] = level
+            base += 8
+            offset += 1
+        self.render_led_map()
+
+    def reset_brightness_map(self):
+        pwm = self.led_brightness_map
+        for reg in range(PWM_REGISTERS):
+            pwm[reg] = 0
         
     def clear_matrix(self):
-        for led in self.led_brightness_map:
-            if led == 16 or led == 32:
+        pwm = self.led_brightness_map
+        for reg in range(PWM_REGISTERS):
+            if reg == 16 or reg == 32:
                 continue
-            self.led_brightness_map[led] = 0
+            pwm[reg] = 0
+        self.render_led_map()
+
+    def set_grey_levels(self, levels):
+        """Set the PWM value (0-255) drawn for each of the 16 greyscale levels."""
+        grey_levels = self.grey_levels
+        for i in range(16):
+            grey_levels[i] = levels[i]
+
+    def set_grey_frame_bytes(self, frame_bytes, offset=0):
+        """Decode a 4-bit-per-LED frame through grey_levels into the PWM buffer and render it.
+
+        Args:
+            frame_bytes: Buffer holding the frame, LED i in the low nibble of byte
+                offset + i // 2 when i is even and the high nibble when odd.
+            offset (int): Where the frame starts in frame_bytes.
+        """
+        pwm = self.led_brightness_map
+        regs = self.led_index_to_reg
+        levels = self.grey_levels
+        count = len(regs)
+        top = self.max_brightness
+        i = 0
+        while i < count:
+            value = frame_bytes[offset]
+            level = levels[value & 0x0f]
+            pwm[regs[i]] = level if level < top else top
+            i += 1
+            if i < count:
+                level = levels[value >> 4]
+                pwm[regs[i]] = level if level < top else top
+                i += 1
+            offset += 1
+        self.render_led_map()
+
+    def set_brightness_table(self, brightness_table):
+        """Pass every level through brightness_table.table (256 entries) when flushing.
+
+        The table is read on every render, so swapping brightness_table.table
+        changes the output without touching the frame. None sends levels as-is.
+        """
+        self.brightness_table = brightness_table
         self.render_led_map()
 
+    def _write_reg(self, reg, value):
+        self._reg_buf[0] = reg
+        self._reg_buf[1] = value
+        self._write(self._reg_buf)
+
+    def set_global_current(self, current):
+        """Scale every LED at once with the global current register (0-64).
+
+        This is a single 2-byte write and leaves the PWM registers alone, so
+        fading the whole matrix doesn't need new frames.
+        """
+        current = max(0, min(GLOBAL_CURRENT_MAX, int(current)))
+        if current != self.global_current:
+            self._write_reg(0xa1, current)
+            self.global_current = current
+
+    def set_global_current_base(self, current):
+        """Set the global current the matrix rests at and switch to it.
+
+        Brightness changes (fades, upside-down dimming) go through here, and
+        effects that strobe the register temporarily return to this value when
+        they end, so they never undo a brightness change made meanwhile. Any
+        current above 0 sets at least 1, the dimmest level, rather than off.
+        """
+        level = max(0, min(GLOBAL_CURRENT_MAX, int(current)))
+        if not level and current > 0:
+            level = 1
+        self.global_current_base = level
+        self.set_global_current(level)
+
+    def fade_global_current(self, target, steps, start=None):
+        """Step the global current from start (default: current value) to target.
+
+        Yields after every step so the caller picks the timing:
+            for _ in led_driver.fade_global_current(0, 20):
+                await asyncio.sleep_ms(10)
+        """
+        if start is None:
+            start = self.global_current
+        steps = max(int(steps), 1)
+        for step in range(1, steps + 1):
+            self.set_global_current(start + (target - start) * step // steps)
+            yield
+
+    def strobe_global_current(self, peak, steps):
+        """Fade the global current from 0 up to peak and back down to 0, yielding after every step."""
+        self.set_global_current(0)
+        yield
+        for _ in self.fade_global_current(peak, steps, 0):
+            yield
+        for _ in self.fade_global_current(0, steps, peak):
+            yield
+
+    def set_cs_scaling(self, cs, scaling):
+        """Set the scaling register (0x90 + cs) of one current source."""
+        self.cs_currents[cs] = scaling
+        self._write_reg(0x90 + cs, scaling)
+
     def set_brightness(self, max_brightness):
         """Set the maximum brightness for all LEDs."""
         self.max_brightness = max_brightness
+        pwm = self.led_brightness_map
+        for reg in range(PWM_REGISTERS):
+            if pwm[reg] > max_brightness:
+                pwm[reg] = max_brightness
         self.render_led_map()
-
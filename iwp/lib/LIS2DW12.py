@@ -92,6 +92,10 @@ class LIS2DW12():
     def mg(self, reg):
         return round(self.int16(self.get2reg(reg)) * 0.061 * (1 << self._scale))
 
+    def mg_from_bytes(self, buf):
+        # Convert an OUT_x_L/OUT_x_H pair already read from the chip
+        return round(self.int16(buf[0] + buf[1] * 256) * 0.061 * (1 << self._scale))
+
     def x(self):
         self.ONE_SHOT()
         return self.mg(LIS2DW12_OUT_X_L)
@@ -8,16 +8,26 @@ from src.mqtt_manager import MQTTManager
 from CONFIG.MQTT_CONFIG import MQTT_USERNAME, MQTT_PASSWORD, MQTT_CLIENT_ID, MQTT_SERVER
 from CONFIG.WIFI_CONFIG import WIFI_LIST
 from src.matrix_functions.matrix_manager import MatrixManager
+from lib.IS31FL3729 import GLOBAL_CURRENT_MAX
 from src.led_controller import LEDController
+from src.ring_effects import RingEffects
 from src.state_manager import StateManager
+from src.frame_store import steps_in_ms
+from src.playback import FramePlayer, LATE_MS
+from src.banner_source import BannerSource
+from src.animation_file import AnimationFileSource
 from src.animations import AnimationManager
+from src.animation_registry import AnimationRegistry
 from src.motion_sensor import MotionSensor
 from src.light_sensor_manager import LightSensorManager
+from src.i2c_bus import I2CBus, PRIORITY_DISPLAY, PRIORITY_SENSOR, PRIORITY_BACKGROUND
 from src.updates import OTAUpdater
+from src.gc_policy import GCPolicy
 from examples.conways_game import generate_conway_frames
 from CONFIG.LED_MANAGER import WS_PWR_PIN, LED_PIN, NUM_LEDS, HUE_INCREMENT, MAX_COLOR_CYCLE
 
 import machine
+import micropython
 
 machine.freq(240000000)
 
@@ -25,30 +35,20 @@ WS_PWR_PIN = 18
 p_ws_leds = Pin(WS_PWR_PIN, Pin.OUT)
 p_ws_leds.value(1)
 
+# Shown at boot, rendered once and then loaded from flash
+BOOT_BANNER = "_DC32_2024_"
+BOOT_BANNER_DELAY = 0.1
+BOOT_BANNER_CACHE = "boot_banner.frames"
+
 # Initialize deep sleep timer
 deep_sleep_timer = Timer(12)
 
-def update_display(t, led_matrix, state_manager):
-    frame, delay = state_manager.get_current_frame()
-    
-    if frame:
-        led_list = state_manager._convert_64bit_to_frame(frame)
-        new_led_list = []
-        
-        max_brightness = int(state_manager.get_brightness_led_matrix() * state_manager.get_lux_modifier())
-        
-        for x, y, brightness in led_list:
-            if brightness > 0:
-                new_led_list.append((x, y, max_brightness))
-            else:
-                new_led_list.append((x, y, brightness))
-
-        led_matrix.set_led_list(new_led_list)
-    gc.collect()
-
-def update_strip(t, led_controller):
-    led_controller.update_strip(t)
-    gc.collect()
+def schedule_job(job, arg):
+    """Timer callback body: queue job to run in the main context instead of the interrupt."""
+    try:
+        micropython.schedule(job, arg)
+    except RuntimeError:
+        pass  # Schedule queue full, the next tick catches up
 
 def reset_motion_flag(t):
     motion_sensor_manager.z_motion = False
@@ -59,7 +59,7 @@ def enter_deep_sleep():
     time.sleep(1)
     p_ws_leds.value(1)
 
-async def fade_brightness(led_controller, state_manager, target_brightness, duration):
+async def fade_brightness(led_controller, led_matrix, target_brightness, duration):
     initial_brightness = led_controller.get_brightness()
     step_count = 50  # Number of steps in the fade transition
     step_duration = duration / step_count
@@ -68,18 +68,20 @@ async def fade_brightness(led_controller, state_manager, target_brightness, dura
     for step in range(step_count):
         current_brightness = initial_brightness + step * brightness_step
         led_controller.set_brightness(current_brightness)
-        state_manager.set_brightness_led_matrix(current_brightness)
+        # The matrix fades in hardware with the global current register (0-64 for 0-100%)
+        led_matrix.set_global_current_base(current_brightness * GLOBAL_CURRENT_MAX / 100)
         await asyncio.sleep(step_duration)
+    led_matrix.set_global_current_base(target_brightness * GLOBAL_CURRENT_MAX / 100)
 
-async def handle_upsidedown(motion_sensor_manager, led_controller, state_manager):
-    await fade_brightness(led_controller, state_manager, 1, 2)  # 2 seconds to transition to full brightness
+async def handle_upsidedown(motion_sensor_manager, led_controller, led_matrix):
+    await fade_brightness(led_controller, led_matrix, 1, 2)  # 2 seconds to transition to full brightness
     await asyncio.sleep(10)  # Wait for 10 seconds while upside down
     if motion_sensor_manager.upsidedown:
         print("Upside down for more than 10 seconds. Turning off LEDs.")
         led_controller.set_brightness(0)
-        state_manager.set_brightness_led_matrix(0)
+        led_matrix.set_global_current_base(0)
 
-def sensor_timer_callback(t, motion_sensor_manager, state_manager, led_controller):
+def sensor_timer_callback(t, motion_sensor_manager, state_manager, led_controller, led_matrix):
     motion_sensor_manager.update_readings()
     state_manager.update_motion_state(motion_sensor_manager)
     
@@ -89,15 +91,16 @@ def sensor_timer_callback(t, motion_sensor_manager, state_manager, led_controlle
     if z_value < -700 and not motion_sensor_manager.upsidedown:
         motion_sensor_manager.upsidedown = True
         print("I'm upside down!")
-        asyncio.create_task(handle_upsidedown(motion_sensor_manager, led_controller, state_manager))
+        asyncio.create_task(handle_upsidedown(motion_sensor_manager, led_controller, led_matrix))
 
     if z_value > -400 and motion_sensor_manager.upsidedown:
         motion_sensor_manager.upsidedown = False
         print("I'm right side up!")
-        asyncio.create_task(fade_brightness(led_controller, state_manager, 100, 2))  # 2 seconds to transition to full brightness
+        asyncio.create_task(fade_brightness(led_controller, led_matrix, 100, 2))  # 2 seconds to transition to full brightness
 
-def trigger_on_beat(t, led_controller):
-    led_controller.update_direction()
+def trigger_on_beat(t, ring_effects):
+    # Flips the ring's direction and lets the current ring effect follow the beat
+    ring_effects.beat()
 
 def ble_timer_callback(t, ble_sync):
     ble_sync.sync_frames(t)
@@ -107,20 +110,33 @@ async def ota_update_kickoff(filename):
     updater = OTAUpdater(f"{filename}")
     await updater.update_file_replace()
 
-def sub_cb(topic, msg, direction_timer, display_timer, state_manager, led_controller, led_matrix, matrix_manager):
+def sub_cb(topic, msg, direction_timer, frame_player, state_manager, led_controller, led_matrix, matrix_manager, animation_registry, ring_effects, beat_timer_cb):
     msg_string = msg.decode("UTF-8")
     print(f"Received message: {msg} on topic: {topic.decode()} ")
     if topic == b'bpm':
         state_manager.current_frame_index = 0
         led_controller.cycle = 0
         bpm = int(int(msg_string) * 1.00)
-        direction_timer.init(period=int(60000 / bpm), mode=Timer.PERIODIC, callback=lambda t: trigger_on_beat(t, led_controller))
-        #display_timer.init(freq=int(bpm/16), mode=Timer.PERIODIC, callback=lambda t: update_display(t, led_matrix, state_manager))
+        direction_timer.init(period=int(60000 / bpm), mode=Timer.PERIODIC, callback=beat_timer_cb)
     if topic == b'banner':
-        frame_generator = matrix_manager.scroll_text_frames(f"{msg_string}", delay=0.05)
-        state_manager.frame_index_to_hash = []
-        for frame, delay in frame_generator:
-            state_manager.add_frame(frame, delay)
+        # Rendered a few frames at a time as it plays, whatever its length
+        frame_player.set_source(BannerSource(matrix_manager, f"{msg_string}", delay=0.05))
+    if topic == b'animation':
+        # Path of an animation file on flash, played from the file as it goes
+        try:
+            frame_player.set_source(AnimationFileSource(msg_string))
+        except (OSError, ValueError) as e:
+            print(f"Cannot play {msg_string}: {e}")
+    if topic == b'play':
+        # Name of a registered animation, built the first time and replayed from then on
+        if animation_registry.play(msg_string):
+            frame_player.set_source(state_manager)
+        else:
+            print(f"No animation called {msg_string}, try one of {animation_registry.names()}")
+    if topic == b'ring':
+        # Name of a ring effect, or rainbow
+        if not ring_effects.select(msg_string):
+            print(f"No ring effect called {msg_string}, try one of {ring_effects.names()}")
     if topic == b'update':
         print("I should update....")
         asyncio.create_task(ota_update_kickoff(msg_string))
@@ -129,42 +145,128 @@ async def schedule_update(msg_string):
     updater = OTAUpdater(f"{msg_string}")
     await updater.update_file_replace()
 
-async def read_light_sensor(light_sensor_manager, state_manager):
+async def read_light_sensor(light_sensor_manager, state_manager, i2c_bus):
     """Coroutine to read light sensor periodically."""
-    while True:
+    def sample():
         lux = light_sensor_manager.read_sensor()  # Measure lux
         if lux is not None:  # Ensure valid lux reading
             state_manager.set_lux_modifier(lux)
+
+    while True:
+        i2c_bus.submit(sample, PRIORITY_BACKGROUND)
         await asyncio.sleep(1)  # Adjust the delay as needed
 
+async def cache_boot_banner(matrix_manager, state_manager, key):
+    """Coroutine rendering the boot banner in the background and saving it for the next boot."""
+    state_manager.begin_frames()
+    frames = 0
+    for frame, delay_ms in steps_in_ms(matrix_manager.scroll_text_frames(BOOT_BANNER, BOOT_BANNER_DELAY)):
+        if not state_manager.add_frame(frame, delay_ms):
+            # Saving it cut short would show a cut banner on every later boot,
+            # so it keeps streaming and the frames go back to the store
+            state_manager.discard_frames()
+            print("Boot banner not cached: frame cache full after {} frames, raise FRAME_CACHE_BUDGET".format(frames))
+            return
+        frames += 1
+        await asyncio.sleep_ms(0)
+    state_manager.publish_frames()
+    state_manager.save_frames(BOOT_BANNER_CACHE, key)
+    print("Boot banner saved to the frame cache")
+
+async def report_first_frame(frame_player, cache_hit):
+    """Coroutine printing how long after boot the first frame showed."""
+    while not frame_player.frames_shown:
+        await asyncio.sleep_ms(10)
+    print("First frame {} ms after boot (frame cache {})".format(frame_player.first_frame_ms, "hit" if cache_hit else "miss"))
+
+async def collect_garbage(gc_policy, frame_player):
+    """Coroutine running the garbage collector between matrix frames, see gc_policy."""
+    while True:
+        gc_policy.step(frame_player.ms_until_next())
+        await asyncio.sleep_ms(1)
+
+async def feed_frames(frame_player):
+    """Coroutine keeping a streaming frame source (e.g. a banner) rendered ahead."""
+    while True:
+        frame_player.fill()
+        await asyncio.sleep_ms(10)
+
+async def report_i2c_stats(i2c_bus, interval=60):
+    """Coroutine to print per-device I2C bus time and utilisation."""
+    while True:
+        await asyncio.sleep(interval)
+        for name, stats in i2c_bus.stats().items():
+            print(f"I2C {name}: {stats['transactions']} transactions, {stats['bytes']} bytes, {stats['utilisation'] * 100:.2f}% busy")
+        i2c_bus.reset_stats()
+
+async def report_ring_stats(led_controller, interval=60):
+    """Coroutine to print how many ring frames were written, skipped or not rendered."""
+    while True:
+        await asyncio.sleep(interval)
+        stats = led_controller.write_stats()
+        print(f"Ring: {stats['writes_per_s']:.1f} writes/s, {stats['skipped_per_s']:.1f} skipped/s, {stats['idle_per_s']:.1f} idle ticks/s, powered {stats['powered']}")
+        led_controller.reset_write_stats()
+
 async def set_led_length(led_controller, wifi_manager):
     while True:
         led_controller.num_leds_lit = wifi_manager.network_count
         await asyncio.sleep(10)
+
+async def update_wifi_signal(ring_effects, wifi_manager):
+    """Coroutine feeding the signal strength to the wifi ring effect."""
+    while True:
+        if wifi_manager.wifi_connected:
+            ring_effects.set_rssi(wifi_manager.wlan.status("rssi"))
+        await asyncio.sleep(10)
     
 
 async def main():
     gc.enable()
-    led_controller = LEDController(NUM_LEDS, LED_PIN, 50, HUE_INCREMENT, MAX_COLOR_CYCLE)
-
-    i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=400000)
+    # The ring switches its own supply off after it has been dark for a while
+    led_controller = LEDController(NUM_LEDS, LED_PIN, 50, HUE_INCREMENT, MAX_COLOR_CYCLE, power_pin=p_ws_leds)
+
+    # Every I2C device shares this bus so their transactions never interleave
+    i2c_bus = I2CBus(I2C(0, scl=Pin(22), sda=Pin(21), freq=400000))
+    i2c_bus.register(0x34, "matrix")
+    i2c_bus.register(0x19, "accelerometer")
+    i2c_bus.register(0x53, "light_sensor")
     state_manager = StateManager()
-    matrix_manager = MatrixManager(state_manager, i2c)
+    matrix_manager = MatrixManager(state_manager, i2c_bus)
     
     # Initialize timers and other components
-    frame_generator = matrix_manager.scroll_text_frames("_DC32_2024_")
-    for frame, delay in frame_generator:
-        state_manager.add_frame(frame, delay)
+    # On a cache miss the banner streams while it is rendered and saved for next time
+    boot_key = matrix_manager.scroll_text_cache_key(BOOT_BANNER, BOOT_BANNER_DELAY)
+    cache_hit = state_manager.load_frames(BOOT_BANNER_CACHE, boot_key)
+    if cache_hit:
+        boot_source = state_manager
+    else:
+        boot_source = BannerSource(matrix_manager, BOOT_BANNER, BOOT_BANNER_DELAY)
+        asyncio.create_task(cache_boot_banner(matrix_manager, state_manager, boot_key))
+
+    animation_registry = AnimationRegistry(state_manager, AnimationManager())
+    animation_registry.register_all()
+    animation_registry.register("banner", lambda: steps_in_ms(matrix_manager.scroll_text_frames(BOOT_BANNER, BOOT_BANNER_DELAY)))
 
+    # Timers only queue their work, bound methods are made once here
+    ring_effects = RingEffects(led_controller)
+    render_strip = led_controller.update_strip
     frame_timer = Timer(1)
-    frame_timer.init(freq=15, mode=Timer.PERIODIC, callback=lambda t: update_strip(t, led_controller))
+    frame_timer.init(freq=15, mode=Timer.PERIODIC, callback=lambda t: schedule_job(render_strip, t))
 
-    display_timer = Timer(2)
-    display_timer.init(freq=15, mode=Timer.PERIODIC, callback=lambda t: update_display(t, matrix_manager.led_matrix, state_manager))
+    # Each frame is held for its own delay, renders go through the bus queue
+    frame_player = FramePlayer(boot_source, matrix_manager.led_matrix, Timer(2),
+                               run=lambda job: i2c_bus.submit(job, PRIORITY_DISPLAY, LATE_MS))
+    frame_player.start()
+    asyncio.create_task(feed_frames(frame_player))
+    asyncio.create_task(collect_garbage(GCPolicy(), frame_player))
+    asyncio.create_task(report_first_frame(frame_player, cache_hit))
 
     direction_timer = Timer(3)
     bpm = 60
-    direction_timer.init(period=int(60000 / bpm), mode=Timer.PERIODIC, callback=lambda t: trigger_on_beat(t, led_controller))
+    # The beat changes ring and effect state, so it runs scheduled like the other timers
+    beat_job = lambda t: trigger_on_beat(t, ring_effects)
+    beat_timer_cb = lambda t: schedule_job(beat_job, t)
+    direction_timer.init(period=int(60000 / bpm), mode=Timer.PERIODIC, callback=beat_timer_cb)
 
     # Initialize WiFi and MQTT managers
     # Comment this section if you don't want wireless features
@@ -173,15 +275,19 @@ async def main():
         #wifi_count_timer.init(period=int(60000 / 30), mode=Timer.PERIODIC, callback=lambda t: set_led_length(t, led_controller, wifi_manager))
         wifi_manager = WiFiConnection()
         asyncio.create_task(set_led_length(led_controller, wifi_manager))
+        asyncio.create_task(update_wifi_signal(ring_effects, wifi_manager))
 
         await wifi_manager.main()
         if MQTT_USERNAME != b"YOURUSERNAME":
             mqtt_manager = MQTTManager(MQTT_SERVER, MQTT_CLIENT_ID, MQTT_USERNAME, MQTT_PASSWORD)
             await mqtt_manager.main(wifi_manager)  # Ensure the MQTT waits for WiFi connection
-            mqtt_manager.set_callback(lambda topic, msg: sub_cb(topic, msg, direction_timer, display_timer, state_manager, led_controller, matrix_manager.led_matrix, matrix_manager))
+            mqtt_manager.set_callback(lambda topic, msg: sub_cb(topic, msg, direction_timer, frame_player, state_manager, led_controller, matrix_manager.led_matrix, matrix_manager, animation_registry, ring_effects, beat_timer_cb))
 
             await mqtt_manager.subscribe(b'bpm')
             await mqtt_manager.subscribe(b'banner')
+            await mqtt_manager.subscribe(b'animation')
+            await mqtt_manager.subscribe(b'play')
+            await mqtt_manager.subscribe(b'ring')
             #await mqtt_manager.subscribe(b'update')
         else:
             print("Please configure your MQTT server to control over the internet")
@@ -190,16 +296,18 @@ async def main():
         #asyncio.create_task(wifi_manager.update_network_count())
 
     # Initialize Light Sensor Manager
-    #light_sensor_manager = LightSensorManager(i2c)
-    # asyncio.create_task(read_light_sensor(light_sensor_manager, state_manager))
+    #light_sensor_manager = LightSensorManager(i2c_bus)
+    # asyncio.create_task(read_light_sensor(light_sensor_manager, state_manager, i2c_bus))
+    # asyncio.create_task(report_i2c_stats(i2c_bus))
+    # asyncio.create_task(report_ring_stats(led_controller))
     
-    motion_sensor_manager = MotionSensor(i2c=i2c)
+    motion_sensor_manager = MotionSensor(i2c=i2c_bus)
     motion_sensor_manager_timer = Timer(4)
-    motion_sensor_manager_timer.init(freq=7, mode=Timer.PERIODIC, callback=lambda t: sensor_timer_callback(t, motion_sensor_manager, state_manager, led_controller))
+    sensor_job = lambda: sensor_timer_callback(None, motion_sensor_manager, state_manager, led_controller, matrix_manager.led_matrix)
+    submit_sensor_job = lambda _: i2c_bus.submit(sensor_job, PRIORITY_SENSOR, 1000 // 7)
+    motion_sensor_manager_timer.init(freq=7, mode=Timer.PERIODIC, callback=lambda t: schedule_job(submit_sensor_job, None))
 
     while True:
-        
         await asyncio.sleep_ms(1)
-        gc.collect()
 
 asyncio.run(main())
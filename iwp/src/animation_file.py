@@ -0,0 +1,204 @@
+"""
+Animations stored as files and played straight from flash.
+
+File layout, little-endian:
+    header   magic b"IWPA", version (1 byte), frame size in bytes (1 byte:
+             FRAME_BYTES for on/off frames, GREY_FRAME_BYTES for greyscale),
+             2 reserved bytes, unique frame count (4 bytes), entry count (4 bytes)
+    entries  one per step of the animation: frame index (2 bytes), delay in ms (2 bytes)
+    frames   the unique frames, frame size bytes each
+
+AnimationFileSource keeps the file open and reads it a few frames ahead into a
+FrameRing with readinto, so RAM use is the same for a ten-frame loop and a
+ten-minute show. FramePlayer plays it like any other source; fill() does the
+reading and is called from the feed_frames coroutine.
+
+Usage:
+    write_animation("/anim/heart.anim", frames)   # (frame, delay ms) pairs
+    frame_player.set_source(AnimationFileSource("/anim/heart.anim"))
+    print(frame_player.source.stats())
+"""
+import time
+import ustruct as struct
+from src.frame_store import FrameRing, FRAME_BYTES, GREY_FRAME_BYTES, GREY_SLOT, clamp_delay_ms
+
+MAGIC = b"IWPA"
+VERSION = 1
+_HEADER = "<4sBBHII"
+HEADER_SIZE = struct.calcsize(_HEADER)
+ENTRY_SIZE = 4
+# Frames read ahead of the display
+RING_FRAMES = 8
+# Entries read per readinto
+ENTRY_CHUNK = 16
+# How soon the player looks again if the ring ran dry
+UNDERRUN_RETRY_MS = 10
+
+
+def write_animation(path, frames, frame_bytes=FRAME_BYTES):
+    """Write (frame, delay in ms) pairs as an animation file, storing repeated frames once.
+
+    Args:
+        path (str): File to write.
+        frames: Iterable of (frame, delay_ms). A frame is a 64-bit int or, for
+            greyscale, GREY_FRAME_BYTES packed bytes. Steps in seconds, as from
+            scroll_text_frames, go through frame_store.steps_in_ms first.
+        frame_bytes (int): FRAME_BYTES or GREY_FRAME_BYTES.
+
+    Returns:
+        Tuple[int, int]: Unique frames and entries written.
+    """
+    index = {}
+    unique = []
+    entries = bytearray()
+    for frame, delay in frames:
+        if isinstance(frame, int):
+            frame = frame.to_bytes(frame_bytes, "little")
+        frame = bytes(frame)
+        if len(frame) != frame_bytes:
+            raise ValueError("frame is {} bytes, expected {}".format(len(frame), frame_bytes))
+        number = index.get(frame)
+        if number is None:
+            number = len(unique)
+            if number > 0xFFFF:
+                raise ValueError("more than 65536 unique frames")
+            index[frame] = number
+            unique.append(frame)
+        entries.extend(struct.pack("<HH", number, clamp_delay_ms(delay)))
+
+    with open(path, "wb") as f:
+        f.write(struct.pack(_HEADER, MAGIC, VERSION, frame_bytes, 0, len(unique), len(entries) // ENTRY_SIZE))
+        f.write(entries)
+        for frame in unique:
+            f.write(frame)
+    return len(unique), len(entries) // ENTRY_SIZE
+
+
+class AnimationFileSource:
+    def __init__(self, path, loop=True, ring_frames=RING_FRAMES):
+        """
+        Args:
+            path (str): Animation file written by write_animation.
+            loop (bool): Start over at the end, otherwise hold the last frame.
+            ring_frames (int): How many frames to read ahead.
+
+        Raises:
+            OSError: The file cannot be opened.
+            ValueError: It is not an animation file this version can play.
+        """
+        self.path = path
+        self.loop = loop
+        self._file = open(path, "rb")
+        header = bytearray(HEADER_SIZE)
+        if self._file.readinto(header) != HEADER_SIZE:
+            self.close()
+            raise ValueError("truncated animation header")
+        magic, version, frame_bytes, _, frame_count, entry_count = struct.unpack(_HEADER, header)
+        if magic != MAGIC or version != VERSION or frame_bytes not in (FRAME_BYTES, GREY_FRAME_BYTES):
+            self.close()
+            raise ValueError("not an animation file: {}".format(path))
+        self.frame_bytes = frame_bytes
+        self.frame_count = frame_count
+        self.entry_count = entry_count
+        self._frames_start = HEADER_SIZE + entry_count * ENTRY_SIZE
+
+        ring = FrameRing(ring_frames, frame_bytes, GREY_SLOT if frame_bytes == GREY_FRAME_BYTES else 0)
+        if ring.tag:
+            self.frame_store, self.grey_store = None, ring
+        else:
+            self.frame_store, self.grey_store = ring, None
+        self._ring = ring
+        # A view per ring slot and one entry buffer, so reading a frame allocates nothing
+        pool = memoryview(ring.pool)
+        self._slot_views = [pool[i * frame_bytes:(i + 1) * frame_bytes] for i in range(ring_frames)]
+        self._entries = bytearray(ENTRY_CHUNK * ENTRY_SIZE)
+        self._entries_view = memoryview(self._entries)
+        self._entry = 0         # Next entry to read from the file
+        self._chunk_pos = 0     # Next entry in self._entries
+        self._chunk_len = 0     # Entries in self._entries
+        self.finished = False
+        self.frame_delay = 0
+        self.reset_stats()
+        self.fill()
+
+    def reset_stats(self):
+        self.frames_read = 0
+        self.underruns = 0
+        self.loops = 0
+        self.read_us_total = 0
+        self.read_us_max = 0
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_read,
+            "underruns": self.underruns,
+            "loops": self.loops,
+            "read_us_avg": self.read_us_total // self.frames_read if self.frames_read else 0,
+            "read_us_max": self.read_us_max,
+            "ring_bytes": self._ring.memory_usage(),
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def fill(self):
+        """Read frames until the ring is full. Call from a coroutine, not a timer."""
+        ring = self._ring
+        slot = ring.push_slot()
+        while slot >= 0 and not self.finished:
+            if self._chunk_pos >= self._chunk_len and not self._read_entries():
+                return
+            entries = self._entries
+            i = self._chunk_pos * ENTRY_SIZE
+            number = entries[i] | entries[i + 1] << 8
+            delay = entries[i + 2] | entries[i + 3] << 8
+            self._chunk_pos += 1
+
+            start = time.ticks_us()
+            f = self._file
+            f.seek(self._frames_start + number * self.frame_bytes)
+            f.readinto(self._slot_views[slot])
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            self.read_us_total += elapsed
+            if elapsed > self.read_us_max:
+                self.read_us_max = elapsed
+            self.frames_read += 1
+
+            ring.commit(delay)
+            slot = ring.push_slot()
+
+    def _read_entries(self):
+        """Load the next chunk of entries, wrapping at the end when looping."""
+        if self._file is None:
+            self.finished = True
+            return False
+        if self._entry >= self.entry_count:
+            if not self.loop or not self.entry_count:
+                self.finished = True
+                return False
+            self._entry = 0
+            self.loops += 1
+        count = min(ENTRY_CHUNK, self.entry_count - self._entry)
+        f = self._file
+        f.seek(HEADER_SIZE + self._entry * ENTRY_SIZE)
+        f.readinto(self._entries_view[:count * ENTRY_SIZE])
+        self._entry += count
+        self._chunk_pos = 0
+        self._chunk_len = count
+        return True
+
+    def next_frame(self):
+        """Pop the next frame for FramePlayer, as StateManager.next_frame does."""
+        ring = self._ring
+        slot = ring.pop()
+        if slot < 0:
+            if self.finished:
+                self.frame_delay = 0
+                return -1
+            self.underruns += 1
+            self.frame_delay = UNDERRUN_RETRY_MS
+            return -1
+        self.frame_delay = ring.frame_delay
+        return slot
@@ -0,0 +1,168 @@
+"""
+Named matrix animations, each built once into a playlist and kept for replay.
+
+An animation is registered with a function that returns its (frame, delay ms)
+steps: rows of 0/1 as in AnimationManager, or 64-bit frame ints as from
+MatrixManager.scroll_text_frames (through frame_store.steps_in_ms, as its
+delays are in seconds). The first play() of a name builds its steps
+into a Playlist of FrameStore slots; after that play() only hands the same
+playlist to StateManager, so switching between cached animations neither
+regenerates nor allocates.
+
+Cached playlists hold references in the state manager's frame_store. At most
+capacity are kept; past that, or when the frame store is full, the least
+recently played one that is not playing is released. A playlist replaced
+with register() while it is playing is retired: the name is rebuilt on its
+next play(), and the old frames are released once they stop playing.
+
+Usage:
+    registry = AnimationRegistry(state_manager, AnimationManager())
+    registry.register_all()
+    registry.register("banner", lambda: steps_in_ms(matrix_manager.scroll_text_frames("DC32", 0.1)))
+    if registry.play("heart"):
+        frame_player.set_source(state_manager)
+    print(registry.stats())
+"""
+from src.frame_store import Playlist
+
+# Compiled animations kept at once
+CAPACITY = 4
+
+
+class AnimationRegistry:
+    def __init__(self, state_manager, animation_manager, capacity=CAPACITY):
+        """
+        Args:
+            state_manager (StateManager): Plays the playlists and owns the frame store.
+            animation_manager (AnimationManager): Packs frames given as rows.
+            capacity (int): How many compiled animations to keep.
+        """
+        self.state_manager = state_manager
+        self.animation_manager = animation_manager
+        self.capacity = capacity
+        self._factories = {}
+        self._playlists = {}
+        self._order = []  # Compiled names, least recently played first
+        self._retired = []  # Replaced playlists still holding frames, see register
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            "cached": len(self._order),
+            "retired": len(self._retired),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "playlist_bytes": sum(playlist.memory_usage() for playlist in self._playlists.values()),
+        }
+
+    def register(self, name, factory):
+        """Add or replace an animation. factory() returns its (frame, delay ms) steps.
+
+        A replaced animation that is playing carries on with its old frames
+        until the next play(name), which builds it from the new factory.
+        """
+        self._factories[name] = factory
+        playlist = self._playlists.get(name)
+        if playlist is not None:
+            if self.state_manager.is_live(playlist):
+                self._retire(name)
+            else:
+                self._drop(name)
+
+    def register_all(self):
+        """Register every AnimationManager animation under its own name."""
+        for name, factory in self.animation_manager.animations.items():
+            self.register(name, factory)
+
+    def names(self):
+        return list(self._factories)
+
+    def play(self, name):
+        """Switch the state manager to name's playlist, building it on first use.
+
+        Returns:
+            bool: False if there is no such animation or none of it fit in the
+            frame store.
+        """
+        playlist = self._playlists.get(name)
+        if playlist is None:
+            if name not in self._factories:
+                return False
+            self.misses += 1
+            playlist = self._compile(name)
+            if playlist is None:
+                return False
+        else:
+            self.hits += 1
+            order = self._order
+            order.remove(name)
+            order.append(name)
+        self.state_manager.publish_playlist(playlist)
+        self._release_retired()
+        # Once it is published the new playlist is live, so this never evicts it
+        while len(self._order) > self.capacity and self._evict():
+            pass
+        return True
+
+    def _compile(self, name):
+        store = self.state_manager.frame_store
+        rows_to_frame_bytes = self.animation_manager.rows_to_frame_bytes
+        playlist = Playlist()
+        for frame, delay_ms in self._factories[name]():
+            if isinstance(frame, int):
+                slot = store.acquire(frame)
+                if slot < 0 and self._evict():
+                    slot = store.acquire(frame)
+            else:
+                frame = rows_to_frame_bytes(frame)
+                slot = store.acquire_bytes(frame)
+                if slot < 0 and self._evict():
+                    slot = store.acquire_bytes(frame)
+            if slot < 0:
+                playlist.truncated = True
+                break
+            playlist.append(slot, delay_ms)
+        if not len(playlist):
+            return None
+        self._playlists[name] = playlist
+        self._order.append(name)
+        return playlist
+
+    def _evict(self):
+        """Release the least recently played playlist that is not playing. False if there is none."""
+        if self._release_retired():
+            return True
+        for name in self._order:
+            if not self.state_manager.is_live(self._playlists[name]):
+                self._drop(name)
+                self.evictions += 1
+                return True
+        return False
+
+    def _drop(self, name):
+        playlist = self._playlists.pop(name)
+        self._order.remove(name)
+        self.state_manager.frame_store.release(playlist.slots)
+
+    def _retire(self, name):
+        """Forget name's playlist, keeping its frames until it stops playing."""
+        self._retired.append(self._playlists.pop(name))
+        self._order.remove(name)
+
+    def _release_retired(self):
+        """Release the retired playlists that are no longer playing. True if there were any."""
+        live = []
+        for playlist in self._retired:
+            if self.state_manager.is_live(playlist):
+                live.append(playlist)
+            else:
+                self.state_manager.frame_store.release(playlist.slots)
+        released = len(live) < len(self._retired)
+        self._retired = live
+        return released
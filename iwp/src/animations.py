@@ -1,16 +1,42 @@
 import random
 import math
 import gc
+from src.frame_store import FRAME_BYTES, GREY_FRAME_BYTES, pack_grey, steps_in_ms
+from src.matrix_functions.matrix_layout import ROWS, COLS
 
 class AnimationManager:
     def __init__(self):
+        # Each one builds its frames when called, so none of them sit in RAM
+        # until played (see AnimationRegistry). The frames below give their
+        # delays in seconds, these hand them out in ms
         self.animations = {
-            "jump_man": self.jump_man_frames,
-            "wave": self.wave,
-            "cat": self.cat,
-            "flashy": self.flashy,
-            "heart": self.heart,
+            "jump_man": lambda: steps_in_ms(self.jump_man_frames),
+            "wave": lambda: steps_in_ms(self.wave),
+            "cat": lambda: steps_in_ms(self.cat),
+            "flashy": lambda: steps_in_ms(self.flashy),
+            "heart": lambda: steps_in_ms(self.heart),
         }
+
+    def rows_to_frame_bytes(self, rows):
+        """Pack a frame given as rows of 0/1, like those below, for FrameStore.acquire_bytes.
+
+        A 7th entry on rows 0 and 1 is the extra LED there (bits 42 and 43), see
+        matrix_layout. Entries past the LEDs that exist are ignored.
+        """
+        frame = bytearray(FRAME_BYTES)
+        for x in range(min(len(rows), ROWS)):
+            row = rows[x]
+            for y in range(min(len(row), COLS + 1)):
+                if row[y]:
+                    if y < COLS:
+                        bit = x * COLS + y
+                    elif x < 2:
+                        bit = ROWS * COLS + x
+                    else:
+                        continue
+                    frame[bit >> 3] |= 1 << (bit & 7)
+        return frame
+
     def generate_motion_frames(self, x_history, y_history, z_history, duration=0.5):
         frames = []
         
@@ -43,6 +69,8 @@ class AnimationManager:
 
         return frames
     def strobe_matrix(self, steps = 10):
+        # Whole frames per step; IS31FL3729.strobe_global_current strobes the
+        # current register instead, one 2-byte write per step
         frames = []
         for i in range(steps):
             frame = []
@@ -77,6 +105,24 @@ class AnimationManager:
             list_of_mod_frames.append((temp_frame, delay))
         return list_of_mod_frames
 
+    def to_grey_frames(self, frames_list, rows=7, cols=6):
+        """Turn (led_list, delay) steps into packed greyscale frames for StateManager.add_grey_frame.
+
+        Each led_list only changes the LEDs it names, as with set_led_list, so
+        step-by-step animations like spiral_and_wipe come out as whole frames.
+        Brightness is 0-255; an extra LED past the end of row x is LED rows * cols + x.
+
+        Yields:
+            Tuple[bytearray, float]: Packed frame and delay.
+        """
+        levels = bytearray(GREY_FRAME_BYTES * 2)
+        for led_list, delay in frames_list:
+            for x, y, brightness in led_list:
+                index = x * cols + y if y < cols else rows * cols + x
+                if index < len(levels):
+                    levels[index] = (min(int(brightness), 255) * 15 + 127) // 255
+            yield pack_grey(levels), delay
+
     def generate_eq_frames(self, num_frames):
         rows = 7
         columns = 6
@@ -0,0 +1,124 @@
+"""
+Scrolling text for the matrix, generated a few frames at a time.
+
+MatrixManager.scroll_text_frames draws the whole text into a framebuffer up
+front and StateManager keeps a frame for every column it scrolls through.
+BannerSource renders the same frames one column window at a time, straight from
+the font, into a small FrameRing. The main loop keeps the ring topped up with
+fill(), FramePlayer pops from it, and when the text has scrolled off it starts
+again from the first frame. Memory stays the same however long the text is,
+and a new banner is ready to show as soon as its first frames are rendered.
+
+Usage:
+    banner = BannerSource(matrix_manager, "HELLO DEF CON", delay=0.05)
+    frame_player.set_source(banner)
+    ...
+    banner.fill()           # From the main loop
+"""
+from src.frame_store import FrameRing, FRAME_BYTES, seconds_to_ms
+
+# Frames rendered ahead of the display
+RING_FRAMES = 8
+# Each character is 6 columns wide plus a blank column
+CHAR_COLUMNS = 7
+# How soon the player looks again if the ring ran dry
+UNDERRUN_RETRY_MS = 10
+
+
+class BannerSource:
+    def __init__(self, matrix_manager, text="DC32", delay=0.1, ring_frames=RING_FRAMES):
+        """
+        Args:
+            matrix_manager (MatrixManager): Supplies the font and the matrix size.
+            text (str): Text to scroll, leading spaces are dropped.
+            delay (float): Seconds per frame, as for scroll_text_frames.
+            ring_frames (int): How many frames to render ahead.
+        """
+        self.matrix_manager = matrix_manager
+        self.text = text.lstrip()
+        self.delay_ms = seconds_to_ms(delay)
+        self.rows = matrix_manager.led_matrix.rows
+        self.cols = matrix_manager.led_matrix.cols
+        self.frame_store = FrameRing(ring_frames)
+        self.grey_store = None
+        # Same length as scroll_text_frames: scroll until the text is off the display
+        self.total_frames = CHAR_COLUMNS * len(self.text) + self.cols
+        self._offset = 0
+        # Column bitmasks (bit x = row x) of the character being rendered
+        self._char_index = -1
+        self._char_columns = bytearray(CHAR_COLUMNS)
+        self.frames_rendered = 0
+        self.loops = 0
+        self.underruns = 0
+        self.frame_delay = 0
+        self.fill()
+
+    def rewind(self):
+        """Render from the first frame again. Frames already in the ring still play."""
+        self._offset = 0
+
+    def fill(self):
+        """Render frames until the ring is full. Call from the main loop, not a timer."""
+        ring = self.frame_store
+        slot = ring.push_slot()
+        while slot >= 0:
+            self._render(ring.pool, ring.offset(slot))
+            ring.commit(self.delay_ms)
+            slot = ring.push_slot()
+
+    def next_frame(self):
+        """Pop the next frame for FramePlayer, as StateManager.next_frame does."""
+        ring = self.frame_store
+        slot = ring.pop()
+        if slot < 0:
+            self.underruns += 1
+            self.frame_delay = UNDERRUN_RETRY_MS
+            return -1
+        self.frame_delay = ring.frame_delay
+        return slot
+
+    def _column(self, column):
+        char_index = column // CHAR_COLUMNS
+        if char_index >= len(self.text):
+            return 0
+        if char_index != self._char_index:
+            pattern = self.matrix_manager.get_char_pattern(self.text[char_index])
+            columns = self._char_columns
+            for y in range(CHAR_COLUMNS - 1):
+                mask = 0
+                for x in range(self.rows):
+                    mask |= (pattern[x][y] & 1) << x
+                columns[y] = mask
+            columns[CHAR_COLUMNS - 1] = 0
+            self._char_index = char_index
+        return self._char_columns[column % CHAR_COLUMNS]
+
+    def _render(self, pool, start):
+        """Write the frame at the current offset into pool[start:start + FRAME_BYTES]."""
+        for i in range(FRAME_BYTES):
+            pool[start + i] = 0
+        cols = self.cols
+        offset = self._offset
+        for y in range(cols):
+            mask = self._column(offset + y)
+            x = 0
+            while mask:
+                if mask & 1:
+                    bit = x * cols + y
+                    pool[start + (bit >> 3)] |= 1 << (bit & 7)
+                mask >>= 1
+                x += 1
+        self.frames_rendered += 1
+        offset += 1
+        if offset >= self.total_frames:
+            offset = 0
+            self.loops += 1
+        self._offset = offset
+
+    def stats(self):
+        return {
+            "frames_rendered": self.frames_rendered,
+            "loops": self.loops,
+            "underruns": self.underruns,
+            "ring_bytes": self.frame_store.memory_usage(),
+        }
@@ -0,0 +1,47 @@
+"""
+Shared brightness pipeline for the LED matrix and the LED ring.
+
+A BrightnessTable maps a logical level (0-255) to the value actually sent to
+the LEDs: a gamma curve scaled so that level 255 comes out at `peak`. The table
+is only rebuilt when the peak changes (global brightness, lux, a fade step), and
+the renderers apply it with one indexed lookup per byte when they flush.
+
+Rebuilding fills a spare table and then swaps the `table` reference, so a timer
+callback that is halfway through a flush keeps using the old one.
+"""
+from array import array
+
+try:
+    from CONFIG.LED_MANAGER import BRIGHTNESS_GAMMA
+except ImportError:
+    BRIGHTNESS_GAMMA = 2.2
+
+# Gamma curve scaled to 0-65535, shared by every table so rebuilding is integer only
+_CURVE = array("H", [int(65535 * (v / 255) ** BRIGHTNESS_GAMMA + 0.5) for v in range(256)])
+
+
+class BrightnessTable:
+    def __init__(self, peak=255):
+        self._tables = (bytearray(256), bytearray(256))
+        self._active = 0
+        self.table = self._tables[0]
+        self.peak = -1
+        self.set_peak(peak)
+
+    def set_peak(self, peak):
+        """Rebuild the table so level 255 maps to peak (0-255).
+
+        Returns:
+            bool: True if the table changed.
+        """
+        peak = max(0, min(255, int(peak)))
+        if peak == self.peak:
+            return False
+        self._active ^= 1
+        table = self._tables[self._active]
+        curve = _CURVE
+        for level in range(256):
+            table[level] = (peak * curve[level] + 32767) // 65535
+        self.table = table
+        self.peak = peak
+        return True
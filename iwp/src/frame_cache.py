@@ -0,0 +1,121 @@
+"""
+Saves a playlist and its frames to flash so the next boot can skip rendering.
+
+File layout, little-endian:
+    header   magic b"IWPF", version (1 byte), pad (1 byte), key (4 bytes),
+             on/off frame count, greyscale frame count, entry count (2 bytes each)
+    body     on/off frames (FRAME_BYTES each), greyscale frames
+             (GREY_FRAME_BYTES each), slots (2 bytes each, indices into the
+             frames above, GREY_SLOT set for greyscale), delays in ms (2 bytes each)
+
+The key is a hash of whatever the frames were generated from (text, font,
+parameters, see cache_key). A file with another key or version is a miss and
+the caller regenerates. The body is read with one readinto.
+
+Usage:
+    key = cache_key("_DC32_2024_", 100, font_file)
+    if not state_manager.load_frames("/boot_banner.frames", key):
+        ...generate, add_frame, publish_frames...
+        state_manager.save_frames("/boot_banner.frames", key)
+"""
+try:
+    import uhashlib
+except ImportError:
+    import hashlib as uhashlib
+try:
+    import uos
+except ImportError:
+    import os as uos
+import ustruct as struct
+from src.frame_store import FRAME_BYTES, GREY_FRAME_BYTES, GREY_SLOT
+
+MAGIC = b"IWPF"
+# Bump when the layout or the meaning of the frames changes
+VERSION = 1
+_HEADER = "<4sBBIHHH"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+
+
+def cache_key(*parts):
+    """32-bit key from the generator inputs. A file path among them counts by its size and mtime."""
+    h = uhashlib.sha256()
+    h.update(bytes((VERSION,)))
+    for part in parts:
+        text = str(part)
+        if text.endswith(".py") or text.endswith(".mpy"):
+            try:
+                stat = uos.stat(text)
+                text = "{}:{}:{}".format(text, stat[6], stat[8])
+            except OSError:
+                pass
+        h.update(text.encode())
+        h.update(b"\0")
+    return int.from_bytes(h.digest()[:4], "little")
+
+
+def save_playlist(path, key, playlist, frame_store, grey_store):
+    """Write playlist and the frames it uses to path."""
+    remap = {}
+    mono = []
+    grey = []
+    for slot in playlist.slots:
+        if slot in remap:
+            continue
+        if slot & GREY_SLOT:
+            remap[slot] = len(grey) | GREY_SLOT
+            grey.append(slot)
+        else:
+            remap[slot] = len(mono)
+            mono.append(slot)
+
+    count = len(playlist)
+    header = struct.pack(_HEADER, MAGIC, VERSION, 0, key, len(mono), len(grey), count)
+    entries = bytearray(count * 4)
+    for i in range(count):
+        slot = remap[playlist.slots[i]]
+        delay = playlist.delays[i]
+        entries[i * 2] = slot & 0xFF
+        entries[i * 2 + 1] = slot >> 8
+        entries[count * 2 + i * 2] = delay & 0xFF
+        entries[count * 2 + i * 2 + 1] = delay >> 8
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for slot in mono:
+            start = frame_store.offset(slot)
+            f.write(frame_store.pool[start:start + FRAME_BYTES])
+        for slot in grey:
+            start = grey_store.offset(slot)
+            f.write(grey_store.pool[start:start + GREY_FRAME_BYTES])
+        f.write(entries)
+    # Replace in one step so a reset mid-write never leaves a torn file
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
+    uos.rename(tmp_path, path)
+
+
+def read_playlist(path, key):
+    """Read a cache file.
+
+    Returns:
+        Tuple[int, int, int, bytearray]: On/off frame count, greyscale frame
+        count, entry count and the body, or None if the file is missing, from
+        another version or key, or short.
+    """
+    header = bytearray(_HEADER_SIZE)
+    try:
+        with open(path, "rb") as f:
+            if f.readinto(header) != _HEADER_SIZE:
+                return None
+            magic, version, _, file_key, mono, grey, count = struct.unpack(_HEADER, header)
+            if magic != MAGIC or version != VERSION or file_key != key:
+                return None
+            body = bytearray(mono * FRAME_BYTES + grey * GREY_FRAME_BYTES + count * 4)
+            if f.readinto(body) != len(body):
+                return None
+    except OSError:
+        return None
+    return mono, grey, count, body
@@ -0,0 +1,323 @@
+from array import array
+
+try:
+    from CONFIG.LED_MANAGER import FRAME_CACHE_BUDGET, GREY_FRAME_CACHE_BUDGET
+except ImportError:
+    FRAME_CACHE_BUDGET = 16 * 1024
+    GREY_FRAME_CACHE_BUDGET = 8 * 1024
+
+# On/off frames are stored as 8-byte little-endian slots, the layout
+# IS31FL3729.set_frame_bytes decodes, so playback never rebuilds the 64-bit int
+FRAME_BYTES = 8
+# Greyscale frames hold 4 bits per LED, LED i in the low nibble of byte i // 2
+# when i is even and the high nibble when odd: 22 bytes covers the 42 grid LEDs
+# and the two extras. IS31FL3729.set_grey_frame_bytes decodes them
+GREY_FRAME_BYTES = 22
+GREY_LEVELS = 16
+# Playlist entries with this bit set are slots in the greyscale store
+GREY_SLOT = 0x8000
+_SLOT_INDEX = 0x7FFF
+# On top of its slot, a unique frame costs a dict entry of two words and a refcount
+_FRAME_OVERHEAD = 8 + 2
+MAX_DELAY_MS = 0xFFFF
+_KEY_MASK = 0x3FFFFFFF  # Dedupe keys stay small ints, which MicroPython does not box
+
+
+def clamp_delay_ms(delay_ms):
+    """Frame delays are kept as 16-bit milliseconds."""
+    return max(0, min(delay_ms, MAX_DELAY_MS))
+
+
+def seconds_to_ms(seconds):
+    """A delay in seconds (0.05), as the milliseconds playlists store (50)."""
+    return clamp_delay_ms(int(seconds * 1000 + 0.5))
+
+
+def steps_in_ms(steps):
+    """(frame, delay in seconds) steps, such as AnimationManager's, with the delays in ms."""
+    for frame, seconds in steps:
+        yield frame, seconds_to_ms(seconds)
+
+
+def pack_grey(levels):
+    """Pack per-LED levels (0-15, in LED index order) into a greyscale frame."""
+    frame = bytearray(GREY_FRAME_BYTES)
+    for i in range(min(len(levels), GREY_FRAME_BYTES * 2)):
+        level = min(max(int(levels[i]), 0), GREY_LEVELS - 1)
+        frame[i >> 1] |= level << 4 if i & 1 else level
+    return frame
+
+
+def _frame_key(frame_bytes):
+    key = 0
+    for b in frame_bytes:
+        key = (key * 31 + b) & _KEY_MASK
+    return key
+
+
+class FrameStore:
+    """Unique frames packed into one bytearray, refcounted by playlist.
+
+    Usage:
+        store = FrameStore()
+        slot = store.acquire(0x21084210841)   # Same frame, same slot
+        led_matrix.set_frame_bytes(store.pool, 255, store.offset(slot))
+        store.release(playlist.slots)         # Once no playlist plays it
+
+        grey = FrameStore(GREY_FRAME_BYTES, GREY_FRAME_CACHE_BUDGET, GREY_SLOT)
+        slot = grey.acquire_bytes(pack_grey(levels))
+
+    Slots come back tagged with tag, so slots from both stores can share one
+    playlist; each store only releases its own.
+
+    The dedupe index maps a 30-bit hash of the frame to its slot. A frame whose
+    hash is already taken by a different frame is stored without an index
+    entry, so it is simply not deduplicated.
+
+    Frames nobody references stay cached, so a banner that comes back is a hit.
+    Once the pool reaches budget bytes their slots are reused, round robin in
+    slot order. When every slot is referenced acquire() returns -1 rather than
+    growing past the budget.
+    """
+
+    def __init__(self, frame_bytes=FRAME_BYTES, budget=FRAME_CACHE_BUDGET, tag=0):
+        self.frame_bytes = frame_bytes
+        self.frame_cost = frame_bytes + _FRAME_OVERHEAD
+        self.budget = budget
+        self.tag = tag
+        self.clear()
+
+    def __len__(self):
+        return len(self.pool) // self.frame_bytes
+
+    def clear(self):
+        self.pool = bytearray()
+        self._index = {}
+        self._refs = array("H")
+        self._unreferenced = 0
+        self._evict_cursor = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def acquire(self, frame):
+        """Take a reference to a 64-bit frame int, storing it if it is new."""
+        return self.acquire_bytes(frame.to_bytes(self.frame_bytes, "little"))
+
+    def acquire_bytes(self, frame_bytes):
+        """Take a reference to a frame, storing it if it is new.
+
+        Args:
+            frame_bytes: The frame, exactly self.frame_bytes long.
+
+        Returns:
+            int: The frame's tagged slot, or -1 if it is new and the budget is full.
+        """
+        size = self.frame_bytes
+        key = _frame_key(frame_bytes)
+        index = self._index
+        pool = self.pool
+        slot = index.get(key)
+        if slot is not None:
+            start = slot * size
+            if pool[start:start + size] == frame_bytes:
+                self.hits += 1
+                self._ref(slot)
+                return slot | self.tag
+
+        self.misses += 1
+        slot = len(self)
+        if (slot + 1) * self.frame_cost <= self.budget and slot <= _SLOT_INDEX:
+            try:
+                pool.extend(frame_bytes)
+                self._refs.append(0)
+            except MemoryError:
+                del pool[slot * size:]
+                self.rejections += 1
+                return -1
+        else:
+            slot = self._evict()
+            if slot < 0:
+                self.rejections += 1
+                return -1
+            pool[slot * size:(slot + 1) * size] = frame_bytes
+        if key not in index:
+            index[key] = slot
+        self._unreferenced += 1
+        self._ref(slot)
+        return slot | self.tag
+
+    def add_unindexed(self, frames, count):
+        """Append count frames that are already unique, e.g. from a cache file, without hashing them.
+
+        They are stored unreferenced (take references with retain) and left
+        out of the dedupe index, so acquire() will not match them.
+
+        Returns:
+            int: Tagged slot of the first frame, or -1 if they do not fit the budget.
+        """
+        base = len(self)
+        if (base + count) * self.frame_cost > self.budget or base + count - 1 > _SLOT_INDEX:
+            self.rejections += 1
+            return -1
+        pool = self.pool
+        try:
+            zeros = array("H", bytes(count * 2))
+            pool.extend(frames)
+            self._refs.extend(zeros)
+        except MemoryError:
+            del pool[base * self.frame_bytes:]
+            self.rejections += 1
+            return -1
+        self._unreferenced += count
+        return base | self.tag
+
+    def retain(self, slot):
+        """Take another reference to a slot this store handed out."""
+        self._ref(slot & _SLOT_INDEX)
+
+    def release(self, slots):
+        """Drop one reference to each of this store's slots in slots, e.g. a retired playlist's."""
+        refs = self._refs
+        tag = self.tag
+        for slot in slots:
+            if slot & GREY_SLOT != tag:
+                continue
+            slot &= _SLOT_INDEX
+            count = refs[slot] - 1
+            refs[slot] = count
+            if not count:
+                self._unreferenced += 1
+
+    def _ref(self, slot):
+        count = self._refs[slot]
+        if not count:
+            self._unreferenced -= 1
+        self._refs[slot] = count + 1
+
+    def _evict(self):
+        """Free an unreferenced slot for reuse, or return -1 if there is none."""
+        if not self._unreferenced:
+            return -1
+        refs = self._refs
+        count = len(refs)
+        slot = self._evict_cursor
+        for _ in range(count):
+            if slot >= count:
+                slot = 0
+            if not refs[slot]:
+                break
+            slot += 1
+        self._evict_cursor = slot + 1
+        start = slot * self.frame_bytes
+        key = _frame_key(self.pool[start:start + self.frame_bytes])
+        if self._index.get(key) == slot:
+            del self._index[key]
+        self._unreferenced -= 1
+        self.evictions += 1
+        return slot
+
+    def offset(self, slot):
+        """Where the frame in slot starts in self.pool."""
+        return (slot & _SLOT_INDEX) * self.frame_bytes
+
+    def frame_bytes_of(self, slot):
+        """A copy of the frame in slot."""
+        start = self.offset(slot)
+        return bytes(self.pool[start:start + self.frame_bytes])
+
+    def frame(self, slot):
+        """The frame in slot as an int. Playback should decode self.pool instead."""
+        return int.from_bytes(self.frame_bytes_of(slot), "little")
+
+    def memory_usage(self):
+        """Bytes charged against the budget, and the cache counters."""
+        return {
+            "frames": len(self),
+            "unreferenced": self._unreferenced,
+            "frame_bytes": len(self) * self.frame_cost,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+
+class Playlist:
+    """Frame slots and their delays in milliseconds, as parallel uint16 arrays."""
+
+    def __init__(self):
+        self.slots = array("H")
+        self.delays = array("H")
+        self.truncated = False  # Set when frames were dropped for lack of room
+
+    def __len__(self):
+        return len(self.slots)
+
+    def append(self, slot, delay_ms):
+        self.slots.append(slot)
+        self.delays.append(clamp_delay_ms(delay_ms))
+
+    def memory_usage(self):
+        return len(self.slots) * 4
+
+
+class FrameRing:
+    """Fixed ring of frames for a producer that stays a few frames ahead.
+
+    One side pushes and the other pops, each only moving its own index, so a
+    timer can pop while the main loop is halfway through a push. Popped slots
+    stay valid until the producer comes round again, so decode them straight
+    away. Slots come back tagged with tag, as from FrameStore.
+    """
+
+    def __init__(self, size, frame_bytes=FRAME_BYTES, tag=0):
+        self.size = size
+        self.frame_bytes = frame_bytes
+        self.tag = tag
+        self.pool = bytearray(size * frame_bytes)
+        self.delays = array("H", [0] * size)
+        self.frame_delay = 0  # Delay of the frame pop() last returned
+        self._head = 0  # Next slot to push, only the producer moves it
+        self._tail = 0  # Next slot to pop, only the consumer moves it
+
+    def __len__(self):
+        return (self._head - self._tail) % self.size
+
+    def full(self):
+        return len(self) == self.size - 1
+
+    def push_slot(self):
+        """The slot to write the next frame into, or -1 when the ring is full.
+
+        Fill pool at offset(slot), then call commit(delay_ms) to publish it.
+        """
+        if self.full():
+            return -1
+        return self._head
+
+    def commit(self, delay_ms):
+        head = self._head
+        self.delays[head] = clamp_delay_ms(delay_ms)
+        self._head = (head + 1) % self.size
+
+    def pop(self):
+        """The oldest frame's tagged slot, or -1 when empty. Its delay in ms is left in frame_delay."""
+        tail = self._tail
+        if tail == self._head:
+            self.frame_delay = 0
+            return -1
+        self._tail = (tail + 1) % self.size
+        self.frame_delay = self.delays[tail]
+        return tail | self.tag
+
+    def offset(self, slot):
+        return (slot & _SLOT_INDEX) * self.frame_bytes
+
+    def memory_usage(self):
+        return len(self.pool) + len(self.delays) * 2
@@ -0,0 +1,103 @@
+"""
+When to run the garbage collector, instead of collecting from timer callbacks.
+
+The timer callbacks allocate nothing (see playback), so garbage only builds up
+in the main loop and coroutines. GCPolicy.step() is called from the main loop
+and collects once that garbage passes collect_bytes, choosing a moment when the
+next matrix frame is at least quiet_ms away so the collection does not make it
+late. If free memory drops below min_free it collects without waiting for a
+quiet moment, but only once force_bytes has been allocated since the last
+collection and at most every force_interval_ms: a low free heap can just be
+live data (frame stores, the ring palette, a cached banner), and collecting
+again would find nothing while starving everything else.
+
+gc.threshold() is set as a backstop, so MicroPython still collects by itself
+if the main loop is starved for a long time.
+
+Usage:
+    gc_policy = GCPolicy()
+    while True:
+        await asyncio.sleep_ms(1)
+        gc_policy.step(frame_player.ms_until_next())
+    print(gc_policy.stats())
+"""
+import gc
+import time
+
+# Collect once this much has been allocated since the last collection
+COLLECT_BYTES = 8 * 1024
+# Below this much free heap, collect even if a frame is due
+MIN_FREE = 16 * 1024
+# Only collect if the next frame is at least this far away
+QUIET_MS = 15
+# Low on memory: collect anyway once this much has been allocated since the last collection
+FORCE_BYTES = 1024
+# ... but not more often than this
+FORCE_INTERVAL_MS = 100
+# MicroPython's own collection after this many bytes, in case step() is not reached
+THRESHOLD_BYTES = 32 * 1024
+
+
+class GCPolicy:
+    def __init__(self, collect_bytes=COLLECT_BYTES, min_free=MIN_FREE, quiet_ms=QUIET_MS, threshold=THRESHOLD_BYTES,
+                 force_bytes=FORCE_BYTES, force_interval_ms=FORCE_INTERVAL_MS):
+        self.collect_bytes = collect_bytes
+        self.min_free = min_free
+        self.quiet_ms = quiet_ms
+        self.force_bytes = force_bytes
+        self.force_interval_ms = force_interval_ms
+        self._forced_ms = time.ticks_add(time.ticks_ms(), -force_interval_ms)
+        gc.threshold(threshold)
+        gc.collect()
+        self._baseline = gc.mem_alloc()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.collections = 0
+        self.forced = 0  # Collected with a frame due, for lack of free memory
+        self.forced_skipped = 0  # Low on memory but too little allocated or too soon to collect again
+        self.collect_us_total = 0
+        self.collect_us_max = 0
+
+    def stats(self):
+        return {
+            "collections": self.collections,
+            "forced": self.forced,
+            "forced_skipped": self.forced_skipped,
+            "collect_us_avg": self.collect_us_total // self.collections if self.collections else 0,
+            "collect_us_max": self.collect_us_max,
+            "mem_free": gc.mem_free(),
+        }
+
+    def step(self, quiet_ms):
+        """Collect if it is time to.
+
+        Args:
+            quiet_ms (int): How long until the next frame, e.g. FramePlayer.ms_until_next().
+
+        Returns:
+            bool: True if it collected.
+        """
+        allocated = gc.mem_alloc()
+        if allocated < self._baseline:
+            # MicroPython collected by itself since
+            self._baseline = allocated
+        if gc.mem_free() < self.min_free:
+            now = time.ticks_ms()
+            if allocated - self._baseline < self.force_bytes or \
+                    time.ticks_diff(now, self._forced_ms) < self.force_interval_ms:
+                self.forced_skipped += 1
+                return False
+            self.forced += 1
+            self._forced_ms = now
+        elif allocated - self._baseline < self.collect_bytes or quiet_ms < self.quiet_ms:
+            return False
+        start = time.ticks_us()
+        gc.collect()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        self.collections += 1
+        self.collect_us_total += elapsed
+        if elapsed > self.collect_us_max:
+            self.collect_us_max = elapsed
+        self._baseline = gc.mem_alloc()
+        return True
@@ -1,5 +1,6 @@
 def hsv_to_rgb(h, s, v):
     if s == 0.0:
+        v = int(255 * v)
         return (v, v, v)
     i = int(h * 6.0)  # Assume int() truncates!
     f = (h * 6.0) - i
@@ -12,3 +13,65 @@ def hsv_to_rgb(h, s, v):
     if i == 3: return (p, q, v)
     if i == 4: return (t, p, v)
     if i == 5: return (v, p, q)
+
+
+# Integer HSV. Hue runs 0-1535, 256 steps for each of the six sectors of the
+# colour wheel (red, yellow, green, cyan, blue, magenta); saturation and value
+# are 0-255. Every intermediate stays below 2**24, so on MicroPython these are
+# small ints and a conversion allocates nothing. Results are within 1 of
+# hsv_to_rgb(hue / 1536, sat / 255, val / 255), see tools/check_hsv.py.
+HUE_RANGE = 1536
+# Where R, G and B go within a pixel of the caller's buffer
+RGB = (0, 1, 2)
+GRB = (1, 0, 2)  # NeoPixel buffer order
+
+
+def hsv_to_rgb_into(buf, offset, hue, sat=255, val=255, order=RGB):
+    """Write one colour into buf[offset:offset + 3], in order."""
+    hsv_fill(buf, offset, 1, hue, 0, sat, val, order)
+
+
+def hsv_fill(buf, offset, count, hue, hue_step=0, sat=255, val=255, order=RGB):
+    """Write count colours into buf from offset, 3 bytes each, the hue moving by hue_step per pixel.
+
+    Args:
+        buf: Writable buffer, e.g. a NeoPixel's buf.
+        offset (int): Byte where the first pixel starts.
+        count (int): Pixels to write.
+        hue (int): Hue of the first pixel, 0-1535 (taken modulo HUE_RANGE).
+        hue_step (int): Added to the hue for each following pixel, may be negative.
+        sat (int): Saturation, 0-255.
+        val (int): Value, 0-255.
+        order: Positions of R, G and B within a pixel, RGB or GRB.
+    """
+    r_at, g_at, b_at = order
+    hue %= HUE_RANGE
+    hue_step %= HUE_RANGE
+    low = val * (255 - sat) // 255
+    for _ in range(count):
+        sector = hue >> 8
+        frac = hue & 0xFF
+        # The channel on its way down in odd sectors, on its way up in even ones
+        if sector & 1:
+            ramp = val * (65280 - sat * frac) // 65280
+        else:
+            ramp = val * (65280 - sat * (256 - frac)) // 65280
+        if sector == 0:
+            r, g, b = val, ramp, low
+        elif sector == 1:
+            r, g, b = ramp, val, low
+        elif sector == 2:
+            r, g, b = low, val, ramp
+        elif sector == 3:
+            r, g, b = low, ramp, val
+        elif sector == 4:
+            r, g, b = ramp, low, val
+        else:
+            r, g, b = val, low, ramp
+        buf[offset + r_at] = r
+        buf[offset + g_at] = g
+        buf[offset + b_at] = b
+        offset += 3
+        hue += hue_step
+        if hue >= HUE_RANGE:
+            hue -= HUE_RANGE
@@ -0,0 +1,200 @@
+"""
+Shared I2C(0) bus for the LED matrix driver, the LIS2DW12 accelerometer and the
+LTR-308ALS light sensor.
+
+I2CBus has the same methods as machine.I2C, so the drivers take it in place of
+the raw bus, and it counts transactions, bytes and time spent per device.
+
+Work that touches the bus from a timer or a coroutine goes through submit().
+Jobs run one at a time in (priority, deadline) order: if a timer fires while
+another job is halfway through its transactions, the new job is queued and run
+as soon as the current one returns instead of interleaving with it.
+
+Usage:
+    bus = I2CBus(I2C(0, scl=Pin(22), sda=Pin(21), freq=400000))
+    bus.register(0x34, "matrix")
+    bus.submit(render_job, PRIORITY_DISPLAY, deadline_ms=66)
+    print(bus.stats())
+"""
+import time
+
+# Lower runs first. Matrix flushes have a frame deadline, sensors can wait a tick
+PRIORITY_DISPLAY = 0
+PRIORITY_SENSOR = 1
+PRIORITY_BACKGROUND = 2
+
+
+class I2CBus:
+    def __init__(self, i2c):
+        self.i2c = i2c
+        # address -> [name, transactions, bytes, busy_us]
+        self._devices = {}
+        # [priority, deadline_ms, job] sorted so the next job to run is first
+        self._queue = []
+        self._running = False
+        self.jobs_run = 0
+        self.jobs_queued = 0
+        self.stats_start = time.ticks_us()
+
+    def register(self, address, name):
+        """Give a device a name for stats()."""
+        self._device(address)[0] = name
+
+    def _device(self, address):
+        device = self._devices.get(address)
+        if device is None:
+            device = [hex(address), 0, 0, 0]
+            self._devices[address] = device
+        return device
+
+    def _account(self, address, nbytes, start):
+        device = self._device(address)
+        device[1] += 1
+        device[2] += nbytes
+        device[3] += time.ticks_diff(time.ticks_us(), start)
+
+    # machine.I2C compatible transactions. Byte counts include the address
+    # byte(s) and register byte sent on the wire.
+    def writeto(self, addr, buf, stop=True):
+        start = time.ticks_us()
+        result = self.i2c.writeto(addr, buf, stop)
+        self._account(addr, len(buf) + 1, start)
+        return result
+
+    def writeto_mem(self, addr, memaddr, buf):
+        start = time.ticks_us()
+        self.i2c.writeto_mem(addr, memaddr, buf)
+        self._account(addr, len(buf) + 2, start)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        start = time.ticks_us()
+        data = self.i2c.readfrom_mem(addr, memaddr, nbytes)
+        self._account(addr, nbytes + 3, start)
+        return data
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        start = time.ticks_us()
+        self.i2c.readfrom_mem_into(addr, memaddr, buf)
+        self._account(addr, len(buf) + 3, start)
+
+    def scan(self):
+        return self.i2c.scan()
+
+    def read_batch(self, addr, reads, scratch):
+        """Read several register ranges from one device with as few bursts as possible.
+
+        Ranges that follow on from each other are read in one auto-increment
+        burst into scratch and then copied out, so reading X, Y and Z of the
+        accelerometer is one transaction instead of six.
+
+        Args:
+            addr (int): Device address.
+            reads: Sequence of (reg, buf) sorted by reg. Each buf is filled
+                from reg onwards.
+            scratch (bytearray): Buffer at least as long as the longest merged burst.
+        """
+        count = len(reads)
+        i = 0
+        while i < count:
+            first_reg = reads[i][0]
+            end_reg = first_reg + len(reads[i][1])
+            j = i + 1
+            while j < count and reads[j][0] == end_reg:
+                end_reg += len(reads[j][1])
+                j += 1
+            if j == i + 1:
+                self.readfrom_mem_into(addr, first_reg, reads[i][1])
+            else:
+                burst = memoryview(scratch)[:end_reg - first_reg]
+                self.readfrom_mem_into(addr, first_reg, burst)
+                for reg, buf in reads[i:j]:
+                    offset = reg - first_reg
+                    for k in range(len(buf)):
+                        buf[k] = burst[offset + k]
+            i = j
+
+    def submit(self, job, priority=PRIORITY_BACKGROUND, deadline_ms=None):
+        """Queue job (a callable doing bus work) and run the queue unless it is already running.
+
+        Args:
+            job: Callable taking no arguments.
+            priority (int): PRIORITY_DISPLAY, PRIORITY_SENSOR or PRIORITY_BACKGROUND.
+            deadline_ms (int): How soon the job has to run, breaks ties within a priority.
+        """
+        if not self._running and not self._queue:
+            # Bus is free: run it now without building a queue entry, so the
+            # display and sensor timers do not allocate
+            self._running = True
+            try:
+                job()
+                self.jobs_run += 1
+            finally:
+                self._running = False
+            if self._queue:
+                # Submitted while the job ran
+                self.run_pending()
+            return
+        now = time.ticks_ms()
+        deadline = time.ticks_add(now, deadline_ms if deadline_ms is not None else 1000)
+        queue = self._queue
+        index = len(queue)
+        for i in range(len(queue)):
+            queued = queue[i]
+            if priority < queued[0] or (priority == queued[0] and time.ticks_diff(deadline, queued[1]) < 0):
+                index = i
+                break
+        queue.insert(index, (priority, deadline, job))
+        if self._running:
+            self.jobs_queued += 1
+            return
+        self.run_pending()
+
+    def run_pending(self):
+        """Run queued jobs in order until the queue is empty."""
+        if self._running:
+            return
+        self._running = True
+        try:
+            queue = self._queue
+            while queue:
+                job = queue.pop(0)[2]
+                job()
+                self.jobs_run += 1
+        finally:
+            self._running = False
+
+    def stats(self):
+        """Per-device bus usage since the last reset_stats().
+
+        Returns:
+            dict: {name: {"transactions", "bytes", "busy_us", "utilisation"}} plus
+            a "total" entry. Utilisation is the fraction of wall time the bus spent
+            on that device's transactions.
+        """
+        elapsed = max(time.ticks_diff(time.ticks_us(), self.stats_start), 1)
+        result = {}
+        transactions = total_bytes = busy_us = 0
+        for name, device_transactions, device_bytes, device_busy_us in self._devices.values():
+            result[name] = {
+                "transactions": device_transactions,
+                "bytes": device_bytes,
+                "busy_us": device_busy_us,
+                "utilisation": device_busy_us / elapsed,
+            }
+            transactions += device_transactions
+            total_bytes += device_bytes
+            busy_us += device_busy_us
+        result["total"] = {
+            "transactions": transactions,
+            "bytes": total_bytes,
+            "busy_us": busy_us,
+            "utilisation": busy_us / elapsed,
+        }
+        return result
+
+    def reset_stats(self):
+        for device in self._devices.values():
+            device[1] = device[2] = device[3] = 0
+        self.jobs_run = 0
+        self.jobs_queued = 0
+        self.stats_start = time.ticks_us()
@@ -1,6 +1,8 @@
 import neopixel
+import time
 from machine import Pin, Timer
-from src.helpers import hsv_to_rgb  # Import the helper function
+from src.brightness import BrightnessTable
+from src.palette import RainbowPalette
 
 try:
     from CONFIG.LED_MANAGER import MAX_BRIGHTNESS
@@ -8,8 +10,19 @@ except:
     print("You didn't provide a max brightness, setting to 100 to not blind you")
     MAX_BRIGHTNESS = 100
 
+# A ring write blocks with interrupts off for about 30 us per pixel, so frames
+# the strip already shows are not written again. After IDLE_AFTER unchanged
+# frames in a row the ring is only rendered every IDLE_EVERY ticks, until the
+# brightness or the lit length changes or a frame comes out different.
+IDLE_AFTER = 15
+IDLE_EVERY = 15
+# Dark this long (ms) and the strip's power is switched off, if it has a power pin
+POWER_OFF_MS = 5000
+# Frames written regardless after power comes back, the first may be lost
+POWER_ON_WRITES = 2
+
 class LEDController:
-    def __init__(self, num_pixels, pin_num, brightness, hue_increment, max_color_cycle, max_brightness=MAX_BRIGHTNESS):
+    def __init__(self, num_pixels, pin_num, brightness, hue_increment, max_color_cycle, max_brightness=MAX_BRIGHTNESS, power_pin=None):
         self.num_pixels = num_pixels
         self.np = neopixel.NeoPixel(Pin(pin_num), num_pixels)
         self.brightness = brightness
@@ -24,7 +37,27 @@ class LEDController:
         self.timer = Timer(-1)
         self.brightness_step = 0
         self.target_brightness = brightness
-        self.num_leds_lit = self.num_pixels/3 * 2
+        self.num_leds_lit = self.num_pixels // 3 * 2
+        # Gamma table applied to every colour channel, rebuilt when brightness changes
+        self.brightness_table = BrightnessTable()
+        self._update_brightness_table()
+        # The rainbow at position 0 for each cycle step, in the NeoPixel buffer's byte order
+        self.palette = RainbowPalette(num_pixels, hue_increment, max_color_cycle, self.np.ORDER[:3])
+        self._buf_view = memoryview(self.np.buf)
+        # A RingEffects drawing the ring instead of the rainbow, or None
+        self.effect = None
+        # What the strip shows, to skip writing the same frame again
+        self._shown = bytearray(len(self.np.buf))
+        self._dark = bytearray(len(self.np.buf))
+        self._unchanged = 0
+        self._ticks = 0
+        self._inputs = -1  # Brightness peak and lit length of the last render
+        # Pin switching the strip's supply (WS_PWR_PIN), or None to leave it on
+        self.power_pin = power_pin
+        self.powered = True
+        self._rewrite = 0  # Writes still to go out even if unchanged, see _power
+        self._dark_since = time.ticks_ms()
+        self.reset_write_stats()
 
     def get_brightness(self):
         return self.max_brightness
@@ -37,21 +70,118 @@ class LEDController:
     def update_position(self):
         self.position = (self.position + self.direction) % self.num_pixels
 
+    def _update_brightness_table(self):
+        self.brightness_table.set_peak(self.brightness * self.max_brightness / 255)
+
+    def set_rainbow(self, hue_increment=None, max_color_cycle=None):
+        """Change the rainbow's spread or speed. The palette is only rebuilt if one of them changed."""
+        if hue_increment is not None:
+            self.hue_increment = hue_increment
+        if max_color_cycle is not None:
+            self.max_color_cycle = max_color_cycle
+            self.cycle %= max_color_cycle
+        self.palette.rebuild(self.hue_increment, self.max_color_cycle)
+
     def generate_frame(self):
-        self.np.fill((0, 0, 0))  # Clear all pixels
-        base_hue = (self.cycle / self.max_color_cycle) % 1
-        for offset in range(self.num_leds_lit):
-            current_hue = (base_hue + offset * self.hue_increment) % 1
-            color = hsv_to_rgb(current_hue, 1, self.brightness / 255 * self.max_brightness / 255)  # Adjust brightness scale
-            idx = (self.position + offset) % self.num_pixels
-            self.np[idx] = color  # Directly set the color in the NeoPixel buffer
+        if self.effect is not None:
+            self.effect.render(self.np.buf)
+            return self.np
+        # This cycle's row of the palette is the whole ring at position 0, with
+        # brightness and the dark pixels already in it; rotating it to position
+        # is two copies, split where the ring wraps
+        palette = self.palette
+        lit = min(self.num_leds_lit, self.num_pixels)
+        start = palette.row(self.cycle, self.brightness_table, lit)
+        row = palette.view
+        buf = self._buf_view
+        end = palette.row_bytes
+        split = self.position * 3
+        buf[split:end] = row[start:start + end - split]
+        buf[0:split] = row[start + end - split:start + end]
         return self.np
 
     def display_frame(self):
-        self.np.write()
+        """Write the buffer to the strip, unless the strip already shows it."""
+        buf = self.np.buf
         self.frame_count += 1
+        if buf != self._dark:
+            self._dark_since = time.ticks_ms()
+            if not self.powered:
+                self._power(True)
+        elif not self.powered:
+            # Off and meant to be dark, nothing to write
+            self._skip()
+            return
+        elif self.power_pin is not None and buf == self._shown and \
+                time.ticks_diff(time.ticks_ms(), self._dark_since) >= POWER_OFF_MS:
+            self._power(False)
+            self._skip()
+            return
+        if buf == self._shown and not self._rewrite:
+            self._skip()
+            return
+        self.np.write()
+        self._shown[:] = buf
+        self.writes += 1
+        self._unchanged = 0
+        if self._rewrite:
+            self._rewrite -= 1
+
+    def wake(self):
+        """Render on the next tick even if the ring is idle, e.g. after an effect's input changed."""
+        self._unchanged = 0
+
+    def _skip(self):
+        self.skipped_writes += 1
+        self._unchanged += 1
+
+    def _power(self, on):
+        # Switched off only once the strip shows dark, which is also what it
+        # shows when it comes back on
+        self.power_pin.value(1 if on else 0)
+        self.powered = on
+        if on:
+            # The first write may be lost while the supply comes up, so the
+            # frame after it is written even if it is the same
+            self._rewrite = POWER_ON_WRITES
+        else:
+            self.power_offs += 1
+
+    def reset_write_stats(self):
+        self.writes = 0
+        self.skipped_writes = 0
+        self.idle_ticks = 0
+        self.power_offs = 0
+        self.stats_start = time.ticks_ms()
+
+    def write_stats(self):
+        """Ring writes since the last reset_write_stats(), for tuning the idle settings.
+
+        Returns:
+            dict: writes and skipped_writes (frames not written, unchanged or
+            dark), idle_ticks (ticks not rendered at all), power_offs, each of
+            the first three also per second, and whether the strip is powered.
+        """
+        seconds = max(time.ticks_diff(time.ticks_ms(), self.stats_start), 1) / 1000
+        return {
+            "writes": self.writes,
+            "skipped_writes": self.skipped_writes,
+            "idle_ticks": self.idle_ticks,
+            "writes_per_s": self.writes / seconds,
+            "skipped_per_s": self.skipped_writes / seconds,
+            "idle_per_s": self.idle_ticks / seconds,
+            "power_offs": self.power_offs,
+            "powered": self.powered,
+        }
 
     def update_strip(self, t):
+        # Idle: nothing has changed for a while, so most ticks are not rendered
+        inputs = self.brightness_table.peak << 16 | self.num_leds_lit
+        self._ticks += 1
+        if inputs == self._inputs and self._unchanged >= IDLE_AFTER and self._ticks % IDLE_EVERY:
+            self.idle_ticks += 1
+            return
+        self._inputs = inputs
         self.generate_frame()
         self.display_frame()
         self.update_position()
@@ -61,6 +191,7 @@ class LEDController:
 
     def set_brightness(self, brightness):
         self.brightness = min(brightness, self.max_brightness)  # Ensure brightness does not exceed max_brightness
+        self._update_brightness_table()
 
     def smooth_brightness_transition(self, target_brightness, duration_ms=75):
         self.target_brightness = min(target_brightness, self.max_brightness)
@@ -78,7 +209,8 @@ class LEDController:
             self.brightness += self.brightness_step
             # Clamp the brightness to ensure it doesn't exceed bounds due to floating point precision issues
             self.brightness = max(0, min(self.brightness, self.max_brightness))
-        self.update_strip(None)  # Update the LED strip with the new brightness
+        # Only the table changes, the next update_strip tick renders with it
+        self._update_brightness_table()
 
 # Example usage
 # controller = LEDController(num_pixels=30, pin_num=2, brightness=50, hue_increment=0.02, max_color_cycle=100)
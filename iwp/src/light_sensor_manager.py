@@ -1,4 +1,4 @@
-from LTR_308ALS import LTR_308ALS
+from lib.LTR_308ALS import LTR_308ALS
 
 class LightSensorManager:
     def __init__(self, i2c):
@@ -8,3 +8,4 @@ class LightSensorManager:
     def read_sensor(self):
         self.lux = self.sensor.getdata()
         #print(f"Current lux: {self.lux}")
+        return self.lux
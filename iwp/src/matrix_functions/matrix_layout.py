@@ -0,0 +1,25 @@
+"""
+Physical layout of the LED matrix on the DC32 Infinite Wifi Portal.
+
+The matrix is 7 rows by 6 columns of white LEDs, plus the green and red LEDs
+which sit at (0, 6) and (1, 6). Each (row, col) maps to the IS31FL3729 PWM
+register that drives it.
+
+Frames are stored as ints where bit x * COLS + y is the LED at (x, y). The two
+extra LEDs come after the grid, at bits 42 and 43.
+"""
+
+ROWS = 7
+COLS = 6
+
+# This is the physical representation of the current LED lay out. This is for our custom 6x7 pixel grid display
+# #DO NOT CHANGE
+LED_MATRIX_MAP = {
+    (0, 0): 0x2e, (0, 1): 0x2d, (0, 2): 0x1e, (0, 3): 0x1d, (0, 4): 0x0e, (0, 5): 0x0d, (0, 6): 0x1f,
+    (1, 0): 0x2c, (1, 1): 0x2b, (1, 2): 0x1c, (1, 3): 0x1b, (1, 4): 0x0c, (1, 5): 0x0b, (1, 6): 0x0f,
+    (2, 0): 0x2a, (2, 1): 0x29, (2, 2): 0x1a, (2, 3): 0x19, (2, 4): 0x0a, (2, 5): 0x09,
+    (3, 0): 0x28, (3, 1): 0x27, (3, 2): 0x18, (3, 3): 0x17, (3, 4): 0x08, (3, 5): 0x07,
+    (4, 0): 0x26, (4, 1): 0x25, (4, 2): 0x16, (4, 3): 0x15, (4, 4): 0x06, (4, 5): 0x05,
+    (5, 0): 0x24, (5, 1): 0x23, (5, 2): 0x14, (5, 3): 0x13, (5, 4): 0x04, (5, 5): 0x03,
+    (6, 0): 0x22, (6, 1): 0x21, (6, 2): 0x12, (6, 3): 0x11, (6, 4): 0x02, (6, 5): 0x01
+}
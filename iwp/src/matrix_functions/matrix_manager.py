@@ -3,7 +3,10 @@ from machine import Pin, I2C
 import uasyncio as asyncio
 import framebuf
 import math
+from src.matrix_functions import infinity_mirror_font
 from src.matrix_functions.infinity_mirror_font import number_patterns, char_patterns, char_patterns_lower, punctuation_patterns
+from src.frame_cache import cache_key
+from src.matrix_functions.matrix_layout import LED_MATRIX_MAP, ROWS, COLS
 import gc
 
 class MatrixManager:
@@ -19,8 +22,10 @@ class MatrixManager:
         self.led_matrix.cs_currents = cs_currents
         self._create_led_matrix_map()
         self._create_led_brightness_map()
-        self.led_matrix.rows = 7
-        self.led_matrix.cols = 6
+        self.led_matrix.rows = ROWS
+        self.led_matrix.cols = COLS
+        self.led_matrix.compile_led_matrix_map()
+        self.led_matrix.brightness_table = self.state_manager.matrix_brightness_table
         self.led_matrix.start_display()
 
     def refresh(self):
@@ -28,18 +33,10 @@ class MatrixManager:
         gc.collect()
 
     def _create_led_matrix_map(self):
-        self.led_matrix.led_matrix_map = {
-            (0, 0): 0x2e, (0, 1): 0x2d, (0, 2): 0x1e, (0, 3): 0x1d, (0, 4): 0x0e, (0, 5): 0x0d, (0, 6): 0x1f,
-            (1, 0): 0x2c, (1, 1): 0x2b, (1, 2): 0x1c, (1, 3): 0x1b, (1, 4): 0x0c, (1, 5): 0x0b, (1, 6): 0x0f,
-            (2, 0): 0x2a, (2, 1): 0x29, (2, 2): 0x1a, (2, 3): 0x19, (2, 4): 0x0a, (2, 5): 0x09,
-            (3, 0): 0x28, (3, 1): 0x27, (3, 2): 0x18, (3, 3): 0x17, (3, 4): 0x08, (3, 5): 0x07,
-            (4, 0): 0x26, (4, 1): 0x25, (4, 2): 0x16, (4, 3): 0x15, (4, 4): 0x06, (4, 5): 0x05,
-            (5, 0): 0x24, (5, 1): 0x23, (5, 2): 0x14, (5, 3): 0x13, (5, 4): 0x04, (5, 5): 0x03,
-            (6, 0): 0x22, (6, 1): 0x21, (6, 2): 0x12, (6, 3): 0x11, (6, 4): 0x02, (6, 5): 0x01
-        }
+        self.led_matrix.led_matrix_map = dict(LED_MATRIX_MAP)
 
     def _create_led_brightness_map(self):
-        self.led_matrix.led_brightness_map = {i: 0 for i in range(0x30)}
+        self.led_matrix.reset_brightness_map()
 
     def test_turn_on_all(self, brightness=100):
         for x in range(7):
@@ -54,11 +51,15 @@ class MatrixManager:
             return -1
 
         pattern = number_patterns[number]
+        # Draw the number once and fade it with the global current register,
+        # up to the resting level and back to it as it is at the end
+        self.led_matrix.set_global_current(0)
+        self.led_matrix.set_led_list(self._create_buffer_from_pattern(pattern, 255))
         for step in range(steps + 1):
-            brightness = int((math.sin(math.pi * step / steps) ** 2) * 100)
-            buffer = self._create_buffer_from_pattern(pattern, brightness)
-            self.led_matrix.set_led_list(buffer)
+            self.led_matrix.set_global_current((math.sin(math.pi * step / steps) ** 2) * self.led_matrix.global_current_base)
             await asyncio.sleep(fade_time / steps)
+        self.led_matrix.clear_matrix()
+        self.led_matrix.set_global_current(self.led_matrix.global_current_base)
         gc.collect()
 
     def get_char_pattern(self, char):
@@ -102,11 +103,15 @@ class MatrixManager:
             frame_int = self._create_buffer_from_framebuffer(buffer, offset)
             yield frame_int, delay
 
+    def scroll_text_cache_key(self, text="DC32", delay=0.1):
+        """Frame cache key for scroll_text_frames(text, delay), changes with the font file."""
+        font = getattr(infinity_mirror_font, "__file__", "infinity_mirror_font")
+        return cache_key("scroll_text", text, delay, self.led_matrix.rows, self.led_matrix.cols, font)
+
     async def scroll_text(self, text="DC32", delay=0.1):
         frame_generator = self.scroll_text_frames(text, delay)
         for frame, frame_delay in frame_generator:
-            led_list = self._convert_64bit_to_frame(frame)
-            self.led_matrix.set_led_list(led_list)
+            self.led_matrix.set_frame(frame, 255)
             await asyncio.sleep(frame_delay)
         gc.collect()
 
@@ -147,11 +152,19 @@ class MatrixManager:
         yield frame_int, 10
 
     async def fading_strobe_matrix(self, max_brightness=100, steps=5, fade_delay=10):
-        frame_generator = self.fading_strobe_matrix_frames(max_brightness, steps, fade_delay)
-        for frame, frame_delay in frame_generator:
-            led_list = self._convert_64bit_to_frame(frame)
-            self.led_matrix.set_led_list(led_list)
-            await asyncio.sleep_ms(frame_delay)
+        # Light the whole matrix once and strobe it with the global current
+        # register, returning to the resting level as it is at the end
+        peak = self.led_matrix.global_current_base * max_brightness // 100
+        self.led_matrix.set_global_current(0)
+        self.led_matrix.set_frame(self._create_buffer_from_brightness(max_brightness), 255)
+        for _ in self.led_matrix.fade_global_current(peak, steps, 0):
+            await asyncio.sleep_ms(fade_delay)
+        await asyncio.sleep_ms(10)
+        for _ in self.led_matrix.fade_global_current(0, steps, peak):
+            await asyncio.sleep_ms(fade_delay)
+        self.led_matrix.clear_matrix()
+        self.led_matrix.set_global_current(self.led_matrix.global_current_base)
+        await asyncio.sleep_ms(10)
         gc.collect()
 
     def _convert_frame_to_64bit(self, frame):
@@ -161,15 +174,6 @@ class MatrixManager:
             frame_int |= (brightness > 0) << bit_index
         return frame_int
 
-    def _convert_64bit_to_frame(self, frame_int):
-        frame = []
-        for x in range(self.led_matrix.rows):
-            for y in range(self.led_matrix.cols):
-                bit_index = x * self.led_matrix.cols + y
-                brightness = 255 if (frame_int & (1 << bit_index)) else 0
-                frame.append((x, y, brightness))
-        return frame
-
     def _create_buffer_from_pattern(self, pattern, brightness):
         buffer = []
         for x in range(self.led_matrix.rows):
@@ -1,4 +1,4 @@
-from lib.LIS2DW12 import LIS2DW12
+from lib.LIS2DW12 import LIS2DW12, LIS2DW12_OUT_X_L, LIS2DW12_OUT_Y_L, LIS2DW12_OUT_Z_L
 import utime
 
 class MotionSensor:
@@ -20,11 +20,26 @@ class MotionSensor:
         self.previous_jerk_x = 0
         self.previous_jerk_y = 0
         self.previous_jerk_z = 0
+        # When the bus can merge adjacent reads, X, Y and Z come back in one burst
+        self._read_batch = getattr(i2c, 'read_batch', None)
+        self._xyz_reads = (
+            (LIS2DW12_OUT_X_L, bytearray(2)),
+            (LIS2DW12_OUT_Y_L, bytearray(2)),
+            (LIS2DW12_OUT_Z_L, bytearray(2)),
+        )
+        self._xyz_scratch = bytearray(6)
 
     def update_readings(self):
-        x = self.sensor.x()
-        y = self.sensor.y()
-        z = self.sensor.z()
+        if self._read_batch:
+            self.sensor.ONE_SHOT()
+            self._read_batch(self.sensor.addr, self._xyz_reads, self._xyz_scratch)
+            x = self.sensor.mg_from_bytes(self._xyz_reads[0][1])
+            y = self.sensor.mg_from_bytes(self._xyz_reads[1][1])
+            z = self.sensor.mg_from_bytes(self._xyz_reads[2][1])
+        else:
+            x = self.sensor.x()
+            y = self.sensor.y()
+            z = self.sensor.z()
         
         self.x_history.append(x)
         self.y_history.append(y)
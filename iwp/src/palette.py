@@ -0,0 +1,106 @@
+"""
+Prebuilt rainbow frames for the LED ring.
+
+LEDController colours the pixel offset places along the lit arc with hue
+cycle / max_color_cycle + offset * hue_increment, so for a given cycle step the
+ring always shows the same row of colours, only rotated to the current
+position. RainbowPalette keeps one row per cycle step, in the NeoPixel buffer
+order (GRB), with the brightness table already applied and the pixels past the
+lit arc already dark: the whole ring as it should look at position 0. Rendering
+a frame is then two slice copies of the row into the NeoPixel buffer, split
+where the rotation wraps.
+
+A row is worked out with the integer helpers.hsv_to_rgb_into the first time its
+cycle step comes round, so building the palette does not hold up boot, and
+again only when the brightness or the length of the lit arc has changed since.
+A brightness fade therefore redoes one row per frame rather than the palette.
+
+With the defaults (36 pixels, MAX_COLOR_CYCLE 100) the table is 10.8 KB.
+
+Usage:
+    palette = RainbowPalette(NUM_LEDS, HUE_INCREMENT, MAX_COLOR_CYCLE)
+    start = palette.row(cycle, brightness_table, lit)  # palette.view[start:start + 3 * NUM_LEDS]
+    palette.rebuild(HUE_INCREMENT, 50)                 # Starts over only if something changed
+"""
+from array import array
+from src.helpers import HUE_RANGE, GRB, hsv_to_rgb_into
+
+# Hues are worked out with this many fraction bits, so the step between pixels
+# does not drift along the arc
+_HUE_FRACTION_BITS = 8
+# Row key of a row not worked out yet; real keys are peak << 16 | lit
+_UNBUILT = -1
+
+
+class RainbowPalette:
+    def __init__(self, num_pixels, hue_increment, max_color_cycle, order=GRB):
+        """
+        Args:
+            num_pixels (int): Pixels in a row, the whole ring.
+            hue_increment (float): Hue step from one pixel to the next (0-1 is the whole wheel).
+            max_color_cycle (int): Cycle steps for the base hue to go round the wheel.
+            order: Position of R, G and B within a pixel in the buffer.
+        """
+        self.num_pixels = num_pixels
+        self.order = order
+        self.row_bytes = num_pixels * 3
+        self.hue_increment = None
+        self.max_color_cycle = 0
+        self.table = bytearray()
+        self.view = memoryview(self.table)
+        self._keys = array("i")  # Brightness peak and lit length each row was built for
+        self.rebuild(hue_increment, max_color_cycle)
+
+    def rebuild(self, hue_increment, max_color_cycle):
+        """Start the table again for new settings.
+
+        Returns:
+            bool: True if the settings changed and the table was dropped.
+        """
+        if hue_increment == self.hue_increment and max_color_cycle == self.max_color_cycle:
+            return False
+        # New buffers swapped in, so a render halfway through a copy keeps
+        # reading the old one
+        self._keys = array("i", [_UNBUILT] * max_color_cycle)
+        self.table = bytearray(max_color_cycle * self.row_bytes)
+        self.view = memoryview(self.table)
+        self.hue_increment = hue_increment
+        self.max_color_cycle = max_color_cycle
+        self._hue_step = int(hue_increment * (HUE_RANGE << _HUE_FRACTION_BITS) + 0.5)
+        return True
+
+    def build(self, brightness_table, lit):
+        """Work out every row now, e.g. before timing a render."""
+        for cycle in range(self.max_color_cycle):
+            self.row(cycle, brightness_table, lit)
+
+    def row(self, cycle, brightness_table, lit):
+        """Where cycle's row starts in self.table, working it out if it is missing or stale.
+
+        Args:
+            cycle (int): Cycle step.
+            brightness_table (BrightnessTable): Applied to every byte of the row.
+            lit (int): Pixels in the lit arc, at most num_pixels; the rest of the row is dark.
+        """
+        cycle %= self.max_color_cycle
+        start = cycle * self.row_bytes
+        key = brightness_table.peak << 16 | lit
+        if self._keys[cycle] != key:
+            table = self.table
+            order = self.order
+            wheel = HUE_RANGE << _HUE_FRACTION_BITS
+            hue = cycle * wheel // self.max_color_cycle
+            end = start + lit * 3
+            for i in range(start, end, 3):
+                hsv_to_rgb_into(table, i, hue >> _HUE_FRACTION_BITS, 255, 255, order)
+                hue = (hue + self._hue_step) % wheel
+            lut = brightness_table.table
+            for i in range(start, end):
+                table[i] = lut[table[i]]
+            for i in range(end, start + self.row_bytes):
+                table[i] = 0
+            self._keys[cycle] = key
+        return start
+
+    def memory_usage(self):
+        return len(self.table) + len(self._keys) * 4
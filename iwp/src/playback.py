@@ -0,0 +1,177 @@
+"""
+Plays frames on the LED matrix, holding each frame for its own delay.
+
+Frames come from a source: the StateManager playlist, or a BannerSource
+streaming scrolling text. A source has next_frame(), returning a slot and
+leaving its delay in ms in frame_delay, and frame_store / grey_store, whose pool
+and offset(slot) say where the slot's bytes are. Sources with a fill() method
+are topped up through fill() from the main loop.
+
+Delays reach the playlist as ms; producers working in seconds convert them
+once with frame_store.seconds_to_ms or steps_in_ms. Instead of a fixed
+rate timer, FramePlayer re-arms a one-shot timer for every frame. Deadlines are
+chained from the previous deadline rather than from when the timer actually
+fired, so timer latency and render time do not add up into drift. A frame that
+is shown more than LATE_MS after its deadline counts as late; if playback falls
+a whole frame behind it restarts the schedule from now instead of rushing
+through frames to catch up.
+
+The timer callback itself only hands the frame to micropython.schedule, so it
+is safe from a hard interrupt; the frame is shown from the main context as soon
+as the current bytecode finishes. Nothing on the way from the timer to the
+I2C write allocates, so playback never triggers a garbage collection. See
+gc_policy for where collections happen instead.
+
+Usage:
+    player = FramePlayer(state_manager, led_matrix, Timer(2))
+    player.start()
+    ...
+    state_manager.publish_frames()
+    player.kick()           # Show the new playlist now, not after the current hold
+    player.set_source(BannerSource(matrix_manager, "HI"))
+    print(player.stats())
+"""
+import time
+from machine import Timer
+from micropython import schedule
+from src.frame_store import GREY_SLOT
+
+# Shortest hold, so a zero delay cannot starve everything else
+MIN_DELAY_MS = 10
+# How often to look for a playlist while there is none
+IDLE_MS = 100
+# Shown this much after the deadline counts as a late frame
+LATE_MS = 5
+
+
+class FramePlayer:
+    def __init__(self, source, led_matrix, timer, run=None):
+        """
+        Args:
+            source: Where frames come from, e.g. StateManager or BannerSource.
+            led_matrix (IS31FL3729): Matrix driver to render into.
+            timer (Timer): Timer the player re-arms for every frame.
+            run: Optional callable the timer hands the render job to, e.g. to
+                queue it on the I2C bus. Without it the job runs straight from
+                the timer.
+        """
+        self.source = source
+        self.led_matrix = led_matrix
+        self.timer = timer
+        self._run = run
+        self._deadline = time.ticks_ms()
+        self.running = False
+        # Bound once, creating a bound method allocates
+        self._tick_cb = self._tick
+        self._scheduled_cb = self._scheduled
+        self._show_next_cb = self._show_next
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames_shown = 0
+        self.first_frame_ms = -1  # ticks_ms of the first frame, i.e. ms since boot
+        self.late_frames = 0
+        self.max_late_ms = 0
+        self.resyncs = 0
+        self.schedule_misses = 0  # Timer found the schedule queue full
+
+    def stats(self):
+        return {
+            "frames_shown": self.frames_shown,
+            "first_frame_ms": self.first_frame_ms,
+            "late_frames": self.late_frames,
+            "max_late_ms": self.max_late_ms,
+            "resyncs": self.resyncs,
+            "schedule_misses": self.schedule_misses,
+        }
+
+    def start(self):
+        self.running = True
+        self.kick()
+
+    def stop(self):
+        self.running = False
+        self.timer.deinit()
+
+    def set_source(self, source):
+        """Switch to another frame source and show its first frame right away.
+
+        The old source is closed if it has a close() method (e.g. a file).
+        """
+        old = self.source
+        self.source = source
+        close = getattr(old, "close", None)
+        if close is not None and old is not source:
+            close()
+        self.kick()
+
+    def fill(self):
+        """Let the source render ahead, if it does. Call from the main loop."""
+        fill = getattr(self.source, "fill", None)
+        if fill is not None:
+            fill()
+
+    def kick(self):
+        """Drop the current hold and show the next frame right away."""
+        if not self.running:
+            return
+        self._deadline = time.ticks_ms()
+        self._arm(0)
+
+    def _arm(self, wait_ms):
+        self.timer.init(mode=Timer.ONE_SHOT, period=max(wait_ms, 1), callback=self._tick_cb)
+
+    def ms_until_next(self):
+        """How long until the next frame is due, e.g. to fit a garbage collection in before it."""
+        if not self.running:
+            return IDLE_MS
+        return time.ticks_diff(self._deadline, time.ticks_ms())
+
+    def _tick(self, t):
+        try:
+            schedule(self._scheduled_cb, None)
+        except RuntimeError:
+            # The schedule queue is full, come back for the frame shortly
+            self.schedule_misses += 1
+            self._arm(MIN_DELAY_MS)
+
+    def _scheduled(self, _):
+        if self._run is not None:
+            self._run(self._show_next_cb)
+        else:
+            self._show_next()
+
+    def _show_next(self):
+        if not self.running:
+            return
+        now = time.ticks_ms()
+        source = self.source
+        slot = source.next_frame()
+        delay = source.frame_delay
+        if slot >= 0:
+            late = time.ticks_diff(now, self._deadline)
+            if late > LATE_MS:
+                self.late_frames += 1
+                if late > self.max_late_ms:
+                    self.max_late_ms = late
+            if slot & GREY_SLOT:
+                store = source.grey_store
+                self.led_matrix.set_grey_frame_bytes(store.pool, store.offset(slot))
+            else:
+                store = source.frame_store
+                self.led_matrix.set_frame_bytes(store.pool, 255, store.offset(slot))
+            if not self.frames_shown:
+                self.first_frame_ms = now
+            self.frames_shown += 1
+            if delay < MIN_DELAY_MS:
+                delay = MIN_DELAY_MS
+        elif not delay:
+            delay = IDLE_MS
+
+        deadline = time.ticks_add(self._deadline, delay)
+        if time.ticks_diff(deadline, now) <= 0:
+            # More than a frame behind, start the schedule again from now
+            deadline = time.ticks_add(now, delay)
+            self.resyncs += 1
+        self._deadline = deadline
+        self._arm(time.ticks_diff(deadline, time.ticks_ms()))
@@ -0,0 +1,383 @@
+"""
+Effects for the LED ring besides the rainbow.
+
+An effect renders the whole ring into the NeoPixel buffer (GRB, 3 bytes a
+pixel) from a tick count and the phase of the current beat, 0-255. Whatever an
+effect looks up while rendering (colour shades, fade curves, its dark frame) is
+built in activate(), when the effect is selected, so render() only indexes
+bytearrays and does small int arithmetic: no allocation and no floats on the
+Timer 1 path. Effects write full brightness colours and RingEffects passes the
+frame through the controller's BrightnessTable afterwards, so fades and the
+upside-down dimming apply to every effect.
+
+RingEffects plugs into LEDController: while an effect is selected,
+generate_frame() hands the buffer to it instead of the rainbow palette, at the
+same Timer 1 rate. beat(), called from trigger_on_beat, flips the ring's
+direction as before and tells the effect; the time between beats sets the
+phase that breathing follows.
+
+Built in:
+    comet      A fading tail running round the ring, reversing on the beat
+    sparkle    Random twinkles, a burst on every beat
+    breathing  The whole ring fading in and out once per beat
+    vu         A level bar with peak hold, fed by set_level() and kicked by the beat
+    wifi       WiFi signal strength from set_rssi(), red to green
+
+Usage:
+    ring_effects = RingEffects(led_controller)
+    ring_effects.select("comet")
+    ring_effects.beat()          # From trigger_on_beat
+    ring_effects.set_level(180)  # vu
+    ring_effects.set_rssi(-67)   # wifi
+    ring_effects.select("rainbow")
+"""
+import math
+import time
+from src.helpers import HUE_RANGE, GRB, hsv_to_rgb_into
+
+# Selects the rainbow in LEDController rather than an effect
+RAINBOW = "rainbow"
+# Beat length until two beats have been seen, 60 BPM
+BEAT_MS = 1000
+# Gaps between beats outside this are not taken as the tempo (300 to 20 BPM)
+MIN_BEAT_MS = 200
+MAX_BEAT_MS = 3000
+# RSSI shown as an empty and a full ring, in dBm
+RSSI_MIN = -90
+RSSI_MAX = -30
+
+
+def _shades(hue, sat, order):
+    """Colour of hue at every value 0-255, 3 bytes each in order."""
+    table = bytearray(256 * 3)
+    for val in range(256):
+        hsv_to_rgb_into(table, val * 3, hue, sat, val, order)
+    return table
+
+
+class RingEffect:
+    """Base for ring effects: activate() builds the tables, render() draws a frame with them."""
+
+    def activate(self, num_pixels, order=GRB):
+        """Build everything render() needs, for a ring of num_pixels with colour bytes in order."""
+        self.num_pixels = num_pixels
+        self.order = order
+        self._dark = bytearray(num_pixels * 3)
+
+    def render(self, buf, tick, phase):
+        """Draw one frame into buf; the base effect shows the ring dark.
+
+        Args:
+            buf (bytearray): num_pixels * 3 bytes, overwritten.
+            tick (int): Frames rendered since the effect was selected.
+            phase (int): How far through the current beat, 0-255.
+        """
+        buf[:] = self._dark
+
+    def on_beat(self, direction):
+        """Called on every beat with the ring's new direction, 1 or -1."""
+        pass
+
+
+class Comet(RingEffect):
+    def __init__(self, hue=896, length=8):
+        """
+        Args:
+            hue (int): 0-1535, see helpers.HUE_RANGE.
+            length (int): Pixels in the comet, head included.
+        """
+        self.hue = hue
+        self.length = length
+        self.head = 0
+        self.direction = 1
+
+    def activate(self, num_pixels, order=GRB):
+        super().activate(num_pixels, order)
+        length = min(self.length, num_pixels)
+        # Brightest at the head, falling off with the square of the distance
+        self._tail = bytearray(length * 3)
+        for i in range(length):
+            val = 255 * (length - i) * (length - i) // (length * length)
+            hsv_to_rgb_into(self._tail, i * 3, self.hue, 255, val, order)
+        self.head %= num_pixels
+
+    def render(self, buf, tick, phase):
+        buf[:] = self._dark
+        tail = self._tail
+        n = self.num_pixels
+        back = n - self.direction  # One pixel behind the head, kept positive for %
+        pixel = self.head
+        for i in range(0, len(tail), 3):
+            at = pixel * 3
+            buf[at] = tail[i]
+            buf[at + 1] = tail[i + 1]
+            buf[at + 2] = tail[i + 2]
+            pixel = (pixel + back) % n
+        self.head = (self.head + self.direction) % n
+
+    def on_beat(self, direction):
+        self.direction = direction
+
+
+class Sparkle(RingEffect):
+    def __init__(self, hue=0, sat=0, rate=1, burst=6, decay=215):
+        """
+        Args:
+            hue (int): Colour of the sparkles, 0-1535.
+            sat (int): 0 for white sparkles.
+            rate (int): New sparkles each frame.
+            burst (int): Extra sparkles on a beat.
+            decay (int): Each frame a sparkle keeps decay/256 of its brightness.
+        """
+        self.hue = hue
+        self.sat = sat
+        self.rate = rate
+        self.burst = burst
+        self.decay = decay
+        self._pending = 0
+        self._seed = 0xACE1
+
+    def activate(self, num_pixels, order=GRB):
+        super().activate(num_pixels, order)
+        self._shades = _shades(self.hue, self.sat, order)
+        self._fade = bytearray(level * self.decay >> 8 for level in range(256))
+        self._levels = bytearray(num_pixels)
+
+    def render(self, buf, tick, phase):
+        levels = self._levels
+        n = self.num_pixels
+        # xorshift16, every step stays a small int
+        x = self._seed
+        for _ in range(self.rate + self._pending):
+            x ^= (x << 7) & 0xFFFF
+            x ^= x >> 9
+            x ^= (x << 8) & 0xFFFF
+            levels[x % n] = 255
+        self._seed = x
+        self._pending = 0
+        shades = self._shades
+        fade = self._fade
+        at = 0
+        for pixel in range(n):
+            level = levels[pixel]
+            shade = level * 3
+            buf[at] = shades[shade]
+            buf[at + 1] = shades[shade + 1]
+            buf[at + 2] = shades[shade + 2]
+            levels[pixel] = fade[level]
+            at += 3
+
+    def on_beat(self, direction):
+        self._pending = self.burst
+
+
+class Breathing(RingEffect):
+    def __init__(self, hue=1280, sat=255, floor=12):
+        """
+        Args:
+            hue (int): 0-1535.
+            sat (int): 0-255.
+            floor (int): Value at the bottom of a breath, 0-255.
+        """
+        self.hue = hue
+        self.sat = sat
+        self.floor = floor
+
+    def activate(self, num_pixels, order=GRB):
+        super().activate(num_pixels, order)
+        self._shades = _shades(self.hue, self.sat, order)
+        # Brightest on the beat, a cosine down to floor halfway between beats
+        span = 255 - self.floor
+        self._curve = bytearray(
+            self.floor + int(span * (1 + math.cos(2 * math.pi * phase / 256)) / 2 + 0.5) for phase in range(256))
+
+    def render(self, buf, tick, phase):
+        shade = self._curve[phase] * 3
+        shades = self._shades
+        first = shades[shade]
+        second = shades[shade + 1]
+        third = shades[shade + 2]
+        for at in range(0, self.num_pixels * 3, 3):
+            buf[at] = first
+            buf[at + 1] = second
+            buf[at + 2] = third
+
+
+class VUBar(RingEffect):
+    def __init__(self, fall=10, beat_level=200, hold=15):
+        """
+        Args:
+            fall (int): Level lost each frame, 0-255.
+            beat_level (int): Level a beat kicks the bar up to.
+            hold (int): Frames the peak pixel stays before dropping.
+        """
+        self.fall = fall
+        self.beat_level = beat_level
+        self.hold = hold
+        self.level = 0
+        self._peak = 0
+        self._held = 0
+
+    def activate(self, num_pixels, order=GRB):
+        super().activate(num_pixels, order)
+        # Green at the bottom of the bar to red at the top
+        self._gradient = bytearray(num_pixels * 3)
+        for pixel in range(num_pixels):
+            hue = (HUE_RANGE // 3) * (num_pixels - 1 - pixel) // max(num_pixels - 1, 1)
+            hsv_to_rgb_into(self._gradient, pixel * 3, hue, 255, 255, order)
+        self._peak = 0
+
+    def set_level(self, level):
+        """Raise the bar to level (0-255) if it is below; it falls back by itself."""
+        if level > self.level:
+            self.level = min(level, 255)
+
+    def render(self, buf, tick, phase):
+        n = self.num_pixels
+        level = self.level
+        lit = (level * n + 254) // 255
+        if lit >= self._peak:
+            self._peak = lit
+            self._held = self.hold
+        elif self._held:
+            self._held -= 1
+        else:
+            self._peak -= 1
+        buf[:] = self._dark
+        gradient = self._gradient
+        for at in range(lit * 3):
+            buf[at] = gradient[at]
+        if self._peak > lit:
+            at = (self._peak - 1) * 3
+            buf[at] = gradient[at]
+            buf[at + 1] = gradient[at + 1]
+            buf[at + 2] = gradient[at + 2]
+        self.level = level - self.fall if level > self.fall else 0
+
+    def on_beat(self, direction):
+        self.set_level(self.beat_level)
+
+
+class WiFiSignal(RingEffect):
+    def __init__(self, rssi=RSSI_MIN):
+        """
+        Args:
+            rssi (int): Signal to show until set_rssi() is called, in dBm.
+        """
+        self.num_pixels = 0
+        self.set_rssi(rssi)
+
+    def activate(self, num_pixels, order=GRB):
+        super().activate(num_pixels, order)
+        # One colour per bar length, red for one pixel to green for the full ring
+        self._colours = bytearray((num_pixels + 1) * 3)
+        for lit in range(num_pixels + 1):
+            hue = (HUE_RANGE // 3) * lit // num_pixels
+            hsv_to_rgb_into(self._colours, lit * 3, hue, 255, 255, order)
+        self.set_rssi(self.rssi)
+
+    def set_rssi(self, rssi):
+        """Show rssi (dBm) as a bar, RSSI_MIN and below empty, RSSI_MAX and above full."""
+        self.rssi = rssi
+        rssi = max(RSSI_MIN, min(RSSI_MAX, rssi))
+        self.lit = (rssi - RSSI_MIN) * self.num_pixels // (RSSI_MAX - RSSI_MIN)
+
+    def render(self, buf, tick, phase):
+        buf[:] = self._dark
+        colour = self.lit * 3
+        colours = self._colours
+        first = colours[colour]
+        second = colours[colour + 1]
+        third = colours[colour + 2]
+        for at in range(0, colour, 3):
+            buf[at] = first
+            buf[at + 1] = second
+            buf[at + 2] = third
+
+
+class RingEffects:
+    def __init__(self, led_controller):
+        """
+        Args:
+            led_controller (LEDController): The ring; effects render into its NeoPixel buffer.
+        """
+        self.led_controller = led_controller
+        self.effects = {}
+        self.active = None
+        self.name = RAINBOW
+        self.tick = 0
+        self.beat_ms = time.ticks_ms()
+        self.beat_period_ms = BEAT_MS
+        self.vu = VUBar()
+        self.wifi = WiFiSignal()
+        self.register("comet", Comet())
+        self.register("sparkle", Sparkle())
+        self.register("breathing", Breathing())
+        self.register("vu", self.vu)
+        self.register("wifi", self.wifi)
+
+    def register(self, name, effect):
+        """Add or replace an effect (a RingEffect). It is activated when selected."""
+        self.effects[name] = effect
+
+    def names(self):
+        return [RAINBOW] + list(self.effects)
+
+    def select(self, name):
+        """Show the effect called name, or the rainbow for RAINBOW.
+
+        Returns:
+            bool: False if there is no such effect.
+        """
+        led_controller = self.led_controller
+        if name == RAINBOW:
+            effect = None
+        else:
+            effect = self.effects.get(name)
+            if effect is None:
+                return False
+            effect.activate(led_controller.num_pixels, led_controller.np.ORDER[:3])
+        self.active = effect
+        self.name = name
+        self.tick = 0
+        led_controller.effect = self if effect is not None else None
+        led_controller.wake()
+        return True
+
+    def beat(self):
+        """Flip the ring's direction and tell the effect; call from trigger_on_beat."""
+        now = time.ticks_ms()
+        period = time.ticks_diff(now, self.beat_ms)
+        if MIN_BEAT_MS <= period <= MAX_BEAT_MS:
+            self.beat_period_ms = period
+        self.beat_ms = now
+        led_controller = self.led_controller
+        led_controller.update_direction()
+        if self.active is not None:
+            self.active.on_beat(led_controller.direction)
+            led_controller.wake()
+
+    def phase(self):
+        """How far through the current beat, 0-255, carrying on at the last tempo if beats stop."""
+        period = self.beat_period_ms
+        return time.ticks_diff(time.ticks_ms(), self.beat_ms) % period * 256 // period
+
+    def set_level(self, level):
+        """Feed the vu effect, 0-255."""
+        self.vu.set_level(level)
+        if self.active is self.vu:
+            self.led_controller.wake()
+
+    def set_rssi(self, rssi):
+        """Feed the wifi effect, in dBm."""
+        self.wifi.set_rssi(rssi)
+        if self.active is self.wifi:
+            self.led_controller.wake()
+
+    def render(self, buf):
+        """Draw the selected effect into buf and apply the ring's brightness; LEDController calls this."""
+        self.active.render(buf, self.tick, self.phase())
+        self.tick += 1
+        lut = self.led_controller.brightness_table.table
+        for i in range(len(buf)):
+            buf[i] = lut[buf[i]]
@@ -1,11 +1,23 @@
-import uhashlib
-import gc
+from src.brightness import BrightnessTable
+from src.frame_store import FrameStore, Playlist, FRAME_BYTES, GREY_FRAME_BYTES, GREY_FRAME_CACHE_BUDGET, GREY_SLOT
+from src.frame_cache import save_playlist, read_playlist
 
 class StateManager:
     def __init__(self):
         self.current_frame_index = 0
-        self.frame_index_to_hash = []
-        self.frame_hash_table = {}
+        # Playlists are double buffered. The display timer only ever plays
+        # playlist (front); producers fill _back_playlist at their own pace and
+        # publish it through _pending_playlist, a single reference the timer
+        # picks up at its next frame boundary. Published playlists hold
+        # references into frame_store (on/off frames) and grey_store
+        # (greyscale frames, GREY_SLOT set) until the timer has moved past them.
+        self.frame_store = FrameStore()
+        self.grey_store = FrameStore(GREY_FRAME_BYTES, GREY_FRAME_CACHE_BUDGET, GREY_SLOT)
+        self.playlist = Playlist()
+        self._back_playlist = Playlist()
+        self._pending_playlist = None
+        self._published = []
+        self.frame_delay = 0  # Delay of the frame next_frame last returned
         self.x_motion = False
         self.y_motion = False
         self.z_motion = False
@@ -15,39 +27,230 @@ class StateManager:
         self.brightness_target = 100  # Default target brightness
         self.matrix_brightness = 100
         self.lux_modifier = 1.0  # Default lux modifier
+        # Gamma table the matrix driver applies on flush, follows brightness and lux
+        self.matrix_brightness_table = BrightnessTable(self.matrix_brightness * self.lux_modifier)
     
     def set_brightness_led_matrix(self, matrix_brightness=100):
         self.matrix_brightness = matrix_brightness
+        self.matrix_brightness_table.set_peak(self.matrix_brightness * self.lux_modifier)
     
     def get_brightness_led_matrix(self):
         return self.matrix_brightness
 
     def set_lux_modifier(self, lux_value):
         self.lux_modifier = max(0.0, min(1.0, lux_value / 1000.0))  # Normalize lux value to a range [0, 1]
+        self.matrix_brightness_table.set_peak(self.matrix_brightness * self.lux_modifier)
 
     def get_lux_modifier(self):
         return self.lux_modifier
 
-    def add_frame(self, frame, delay):
-        frame_hash = self._hash_frame(frame)
-        if frame_hash not in self.frame_hash_table:
-            self.frame_hash_table[frame_hash] = frame
-        self.frame_index_to_hash.append((frame_hash, delay))
-        gc.collect()
+    def begin_frames(self):
+        """Start a new playlist in the back buffer. add_frame appends to it.
+
+        A published playlist the timer has not picked up yet is withdrawn so
+        its frames can make room for the new one.
+        """
+        self._pending_playlist = None
+        self._release(self._back_playlist)
+        self._back_playlist = Playlist()
+        self._retire_playlists()
+
+    def discard_frames(self):
+        """Drop the back playlist begin_frames started, releasing its frames, without publishing it."""
+        self._release(self._back_playlist)
+        self._back_playlist = Playlist()
+
+    def add_frame(self, frame, delay_ms):
+        """Append frame to the back playlist.
+
+        Args:
+            frame (int): 64-bit frame, bit x * cols + y lights LED (x, y).
+            delay_ms (int): How long the frame is shown, in ms (see frame_store.seconds_to_ms).
+
+        Returns:
+            bool: False once the frame cache is full. The playlist is cut short
+            there and later frames are ignored until the next begin_frames.
+        """
+        if self._back_playlist.truncated:
+            return False
+        return self._append(self.frame_store, self.frame_store.acquire(frame), delay_ms)
+
+    def add_grey_frame(self, frame_bytes, delay_ms):
+        """Append a greyscale frame to the back playlist.
+
+        Args:
+            frame_bytes: GREY_FRAME_BYTES bytes, 4 bits per LED (see frame_store.pack_grey).
+            delay_ms (int): How long the frame is shown, in ms (see frame_store.seconds_to_ms).
+
+        Returns:
+            bool: False once the greyscale cache is full, as for add_frame.
+        """
+        if self._back_playlist.truncated:
+            return False
+        return self._append(self.grey_store, self.grey_store.acquire_bytes(frame_bytes), delay_ms)
+
+    def _append(self, store, slot, delay_ms):
+        playlist = self._back_playlist
+        if slot >= 0:
+            try:
+                playlist.append(slot, delay_ms)
+                return True
+            except MemoryError:
+                store.release((slot,))
+        playlist.truncated = True
+        return False
+
+    def publish_frames(self):
+        """Swap the back buffer in for playback.
+
+        The display timer switches over at its next frame and starts the new
+        playlist from the beginning; the old one keeps playing until then.
+        """
+        self._pending_playlist = self._back_playlist
+        self._published.append(self._back_playlist)
+        self._back_playlist = Playlist()
+        self._retire_playlists()
+
+    def publish_playlist(self, playlist):
+        """Play a playlist someone else keeps, e.g. AnimationRegistry, in place of the current one.
+
+        Unlike publish_frames, the frames are not released when the playlist
+        stops playing; its owner holds the references and must not release
+        them while is_live(playlist).
+        """
+        self._pending_playlist = playlist
+        if self._published:
+            self._retire_playlists()
+
+    def is_live(self, playlist):
+        """True while the timer is playing playlist or about to."""
+        # Pending before the front, as in _retire_playlists
+        pending = self._pending_playlist
+        return playlist is pending or playlist is self.playlist
+
+    def _retire_playlists(self):
+        """Release the frames of published playlists the timer will not play again."""
+        # Read pending before the front: the timer only ever moves pending to
+        # the front, so a playlist in flight between the two is still seen
+        pending = self._pending_playlist
+        front = self.playlist
+        live = []
+        for playlist in self._published:
+            if playlist is pending or playlist is front:
+                live.append(playlist)
+            else:
+                self._release(playlist)
+        self._published = live
+
+    def _release(self, playlist):
+        self.frame_store.release(playlist.slots)
+        self.grey_store.release(playlist.slots)
+
+    def save_frames(self, path, key):
+        """Save the playlist that is playing (or about to) and its frames to flash, see frame_cache."""
+        playlist = self._pending_playlist
+        if playlist is None:
+            playlist = self.playlist
+        save_playlist(path, key, playlist, self.frame_store, self.grey_store)
+
+    def load_frames(self, path, key):
+        """Publish the playlist saved at path if it was saved with key.
+
+        The frames go into the stores as they are, without hashing each one
+        again, so this costs little more than reading the file.
+
+        Returns:
+            bool: False on a cache miss (no file, another key or version, a
+            frame index past the frames in the file, or too big for the
+            budget); the caller should regenerate.
+        """
+        data = read_playlist(path, key)
+        if data is None:
+            return False
+        mono, grey, count, body = data
+        view = memoryview(body)
+        grey_start = mono * FRAME_BYTES
+        entries = grey_start + grey * GREY_FRAME_BYTES
+        # The key says which frames these are, not that the file is intact
+        for i in range(count):
+            slot = body[entries + i * 2] | body[entries + i * 2 + 1] << 8
+            if (slot & ~GREY_SLOT >= grey) if slot & GREY_SLOT else (slot >= mono):
+                return False
+        self.begin_frames()
+        mono_base = self.frame_store.add_unindexed(view[:grey_start], mono) if mono else 0
+        grey_base = self.grey_store.add_unindexed(view[grey_start:entries], grey) if grey else GREY_SLOT
+        if mono_base < 0 or grey_base < 0:
+            # Frames that did go in stay unreferenced, for the stores to reuse
+            self.discard_frames()
+            return False
+        playlist = self._back_playlist
+        delays = entries + count * 2
+        for i in range(count):
+            slot = body[entries + i * 2] | body[entries + i * 2 + 1] << 8
+            if slot & GREY_SLOT:
+                slot = grey_base + (slot & ~GREY_SLOT)
+                self.grey_store.retain(slot)
+            else:
+                slot += mono_base
+                self.frame_store.retain(slot)
+            playlist.append(slot, body[delays + i * 2] | body[delays + i * 2 + 1] << 8)
+        self.publish_frames()
+        return True
+
+    def next_frame(self):
+        """Advance the playlist.
+
+        The frame's delay in ms is left in frame_delay rather than returned
+        with the slot, so the display timer does not allocate a tuple per frame.
+
+        Returns:
+            int: Slot of the frame, or -1 (frame_delay 0) when nothing is
+            loaded. Slots with GREY_SLOT set are in grey_store, the rest in
+            frame_store.
+        """
+        pending = self._pending_playlist
+        if pending is not None:
+            self._pending_playlist = None
+            self.playlist = pending
+            self.current_frame_index = 0
+        playlist = self.playlist
+        count = len(playlist)
+        if not count:
+            self.frame_delay = 0
+            return -1
+        index = self.current_frame_index
+        if index >= count:
+            index = 0
+        self.current_frame_index = index + 1 if index + 1 < count else 0
+        self.frame_delay = playlist.delays[index]
+        return playlist.slots[index]
 
     def get_current_frame(self):
-        if self.frame_index_to_hash:
-            if self.current_frame_index >= len(self.frame_index_to_hash):
-                self.current_frame_index = 0
-            frame_hash, delay = self.frame_index_to_hash[self.current_frame_index]
-            frame = self.frame_hash_table[frame_hash]
-            self.current_frame_index = (self.current_frame_index + 1) % len(self.frame_index_to_hash)
-            return frame, delay
-        return None, 0
+        """Advance the playlist and return (frame, delay in ms), or (None, 0).
+
+        The frame is an int, or the packed bytes of a greyscale frame.
+        """
+        slot = self.next_frame()
+        delay = self.frame_delay
+        if slot < 0:
+            return None, 0
+        if slot & GREY_SLOT:
+            return self.grey_store.frame_bytes_of(slot), delay
+        return self.frame_store.frame(slot), delay
+
+    def memory_usage(self):
+        """Frame cache counters and the bytes held by frames and playlists."""
+        usage = self.frame_store.memory_usage()
+        usage["playlist_bytes"] = self.playlist.memory_usage() + self._back_playlist.memory_usage()
+        if self._pending_playlist is not None:
+            usage["playlist_bytes"] += self._pending_playlist.memory_usage()
+        usage["grey"] = self.grey_store.memory_usage()
+        usage["total_bytes"] = usage["frame_bytes"] + usage["grey"]["frame_bytes"] + usage["playlist_bytes"]
+        return usage
 
     def set_current_frame(self, frame_num):
-        if self.frame_index_to_hash:
-            self.current_frame_index = frame_num % len(self.frame_index_to_hash)
+        if len(self.playlist):
+            self.current_frame_index = frame_num % len(self.playlist)
         else:
             self.current_frame_index = 0
 
@@ -66,16 +269,3 @@ class StateManager:
         if self.z_motion:
             print("Z motion detected")
             self.z_motion = False
-
-    def _hash_frame(self, frame):
-        frame_bytes = frame.to_bytes(8, 'big')  # Ensure frame is treated as an integer
-        return uhashlib.sha256(frame_bytes).digest()[:8]  # 64-bit hash
-
-    def _convert_64bit_to_frame(self, frame_int):
-        frame = []
-        for x in range(7):
-            for y in range(6):
-                bit_index = x * 6 + y
-                brightness = 255 if (frame_int & (1 << bit_index)) else 0
-                frame.append((x, y, brightness))
-        return frame
\ No newline at end of file
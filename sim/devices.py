@@ -0,0 +1,247 @@
+"""
+Register-level models of the badge's peripherals for the simulation.
+
+Each I2C model keeps a 256-byte register file with the auto-increment behaviour
+the drivers rely on, so a write of [reg, d0, d1, ...] lands in reg, reg + 1, ...
+and a read from reg returns consecutive registers. I2CBusModel records every
+transaction so the runner can report bytes per device.
+"""
+import errno
+import struct
+
+
+class I2CBusModel:
+    def __init__(self, freq=400000):
+        self.freq = freq
+        self.devices = {}
+        # address -> [transactions, bytes on the wire]
+        self.traffic = {}
+        self.log = None  # set to a list to record (address, "w"/"r", reg, bytes) tuples
+
+    def attach(self, device):
+        self.devices[device.address] = device
+        return device
+
+    def _device(self, address):
+        device = self.devices.get(address)
+        if device is None:
+            raise OSError(errno.ENODEV, "ENODEV")
+        return device
+
+    def _account(self, address, nbytes, kind, reg, data):
+        traffic = self.traffic.setdefault(address, [0, 0])
+        traffic[0] += 1
+        traffic[1] += nbytes
+        if self.log is not None:
+            self.log.append((address, kind, reg, bytes(data)))
+
+    def bus_time_us(self, nbytes):
+        # 9 clocks per byte plus start/stop
+        return (nbytes * 9 + 2) * 1000000 // self.freq
+
+    def write(self, address, data):
+        device = self._device(address)
+        data = bytes(data)
+        if data:
+            device.write(data[0], data[1:])
+        self._account(address, len(data) + 1, "w", data[0] if data else None, data[1:])
+
+    def write_mem(self, address, reg, data):
+        device = self._device(address)
+        data = bytes(data)
+        device.write(reg, data)
+        self._account(address, len(data) + 2, "w", reg, data)
+
+    def read_mem(self, address, reg, nbytes):
+        device = self._device(address)
+        data = device.read(reg, nbytes)
+        self._account(address, nbytes + 3, "r", reg, data)
+        return data
+
+
+class RegisterDevice:
+    name = "device"
+
+    def __init__(self, address):
+        self.address = address
+        self.regs = bytearray(256)
+
+    def write(self, reg, data):
+        for i, value in enumerate(data):
+            self.on_write((reg + i) & 0xFF, value)
+
+    def on_write(self, reg, value):
+        self.regs[reg] = value
+
+    def read(self, reg, nbytes):
+        return bytes(self.on_read((reg + i) & 0xFF) for i in range(nbytes))
+
+    def on_read(self, reg):
+        return self.regs[reg]
+
+
+class IS31FL3729Model(RegisterDevice):
+    """LED matrix driver: PWM registers 0x00-0x8F, scaling 0x90-0x9F,
+    configuration 0xA0, global current 0xA1 and reset 0xCF."""
+    name = "IS31FL3729"
+
+    def __init__(self, address=0x34):
+        super().__init__(address)
+        self.pwm_writes = 0
+        self.resets = 0
+
+    def on_write(self, reg, value):
+        if reg == 0xCF:
+            if value == 0xAE:
+                self.regs[:] = bytes(256)
+                self.resets += 1
+            return
+        self.regs[reg] = value
+
+    def write(self, reg, data):
+        if reg < 0x90:
+            self.pwm_writes += 1
+        super().write(reg, data)
+
+    @property
+    def global_current(self):
+        return self.regs[0xA1]
+
+    def render(self, led_matrix_map, rows, cols):
+        """ASCII picture of the matrix: '#' lit, '+' dim, '.' off."""
+        lines = []
+        for x in range(rows):
+            line = ""
+            for y in range(cols):
+                level = self.regs[led_matrix_map[(x, y)]]
+                line += "#" if level >= 128 else ("+" if level else ".")
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class LIS2DW12Model(RegisterDevice):
+    """Accelerometer at rest. set_acceleration() sets what the OUT registers read back."""
+    name = "LIS2DW12"
+
+    WHO_AM_I = 0x0F
+    CTRL3 = 0x22
+    CTRL6 = 0x25
+    OUT_T_L = 0x0D
+    OUT_X_L = 0x28
+
+    def __init__(self, address=0x19):
+        super().__init__(address)
+        self.regs[self.WHO_AM_I] = 0x44
+        self.set_acceleration(0, 0, 1000)  # Face up
+
+    def set_acceleration(self, x_mg, y_mg, z_mg):
+        scale = 1 << ((self.regs[self.CTRL6] >> 4) & 3)
+        for i, mg in enumerate((x_mg, y_mg, z_mg)):
+            raw = max(-32768, min(32767, int(round(mg / (0.061 * scale)))))
+            struct.pack_into("<h", self.regs, self.OUT_X_L + 2 * i, raw)
+
+    def set_temperature(self, celsius):
+        struct.pack_into("<h", self.regs, self.OUT_T_L, int((celsius - 25) * 256))
+
+    def on_write(self, reg, value):
+        if reg == self.CTRL3:
+            value &= 0xFE  # One-shot conversions complete immediately
+        self.regs[reg] = value
+
+
+class LTR308Model(RegisterDevice):
+    """Ambient light sensor. set_lux() sets what the ALS data registers read back."""
+    name = "LTR-308ALS"
+
+    GAIN = 0x05
+    PART_ID = 0x06
+    DATA = 0x0D
+    _GAINS_X = (1, 3, 6, 9, 18)
+
+    def __init__(self, address=0x53):
+        super().__init__(address)
+        self.regs[self.PART_ID] = 0xB1
+        self.lux = 300.0
+
+    def on_read(self, reg):
+        if self.DATA <= reg < self.DATA + 3:
+            gain = self._GAINS_X[min(self.regs[self.GAIN], 4)]
+            counts = min(int(self.lux * gain / 0.6), 0xFFFFF)
+            return (counts >> (8 * (reg - self.DATA))) & 0xFF
+        return self.regs[reg]
+
+    def set_lux(self, lux):
+        self.lux = lux
+
+
+class MQTTBroker:
+    """Minimal MQTT 3.1.1 broker on the far end of a loopback socket.
+
+    Accepts CONNECT, SUBSCRIBE, PINGREQ and PUBLISH from the badge and lets the
+    simulation push PUBLISH packets for subscribed topics with publish().
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.subscriptions = set()
+        self.received = []  # (topic, msg) published by the badge
+
+    def connect(self, conn):
+        self.connections.append(conn)
+
+    @staticmethod
+    def _encode_len(size):
+        out = bytearray()
+        while True:
+            byte = size & 0x7F
+            size >>= 7
+            out.append(byte | (0x80 if size else 0))
+            if not size:
+                return bytes(out)
+
+    def publish(self, topic, msg):
+        """Send a QoS 0 PUBLISH to every connection subscribed to topic."""
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        body = struct.pack("!H", len(topic)) + topic + msg
+        packet = b"\x30" + self._encode_len(len(body)) + body
+        if topic in self.subscriptions:
+            for conn in self.connections:
+                conn.inbound += packet
+        return topic in self.subscriptions
+
+    def handle(self, conn):
+        """Consume every complete packet the badge has written."""
+        data = conn.outbound
+        while len(data) >= 2:
+            size = 0
+            shift = 0
+            i = 1
+            while True:
+                if i >= len(data):
+                    return
+                byte = data[i]
+                size |= (byte & 0x7F) << shift
+                shift += 7
+                i += 1
+                if not byte & 0x80:
+                    break
+            if len(data) < i + size:
+                return
+            packet_type = data[0] & 0xF0
+            body = bytes(data[i:i + size])
+            del data[:i + size]
+            if packet_type == 0x10:  # CONNECT
+                conn.inbound += b"\x20\x02\x00\x00"
+            elif packet_type == 0x80:  # SUBSCRIBE
+                pid = body[:2]
+                topic_len = struct.unpack("!H", body[2:4])[0]
+                self.subscriptions.add(body[4:4 + topic_len])
+                conn.inbound += b"\x90\x03" + pid + b"\x00"
+            elif packet_type == 0xC0:  # PINGREQ
+                conn.inbound += b"\xd0\x00"
+            elif packet_type == 0x30:  # PUBLISH
+                topic_len = struct.unpack("!H", body[:2])[0]
+                self.received.append((body[2:2 + topic_len], body[2 + topic_len:]))
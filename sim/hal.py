@@ -0,0 +1,108 @@
+"""
+Shared state behind the simulated MicroPython modules in sim/modules.
+
+Everything the stand-in modules need to agree on lives here: the virtual clock
+and the timers it drives, the I2C buses and the device models attached to them,
+the WLAN networks a scan returns, the loopback MQTT broker and the canned HTTP
+responses. run.py sets these up before booting main.py.
+"""
+import heapq
+import traceback
+
+
+class StopSimulation(Exception):
+    """Raised by the clock once the requested run time has passed."""
+
+
+class VirtualClock:
+    """Millisecond/microsecond clock that only moves when the simulation advances it.
+
+    Timers registered with the clock fire in deadline order while it advances,
+    and callbacks queued with micropython.schedule run right after them, the way
+    soft IRQ callbacks run between bytecodes on the badge.
+    """
+
+    def __init__(self):
+        self.now_us = 0
+        self.end_us = None
+        self._timers = []  # heap of (due_us, seq, timer)
+        self._seq = 0
+        self._scheduled = []
+        self.timer_fires = {}
+        self.callback_errors = 0
+
+    def ticks_us(self):
+        return self.now_us
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def add_timer(self, timer, due_us):
+        self._seq += 1
+        heapq.heappush(self._timers, (due_us, self._seq, timer))
+
+    def schedule(self, func, arg):
+        self._scheduled.append((func, arg))
+
+    def run_scheduled(self):
+        while self._scheduled:
+            func, arg = self._scheduled.pop(0)
+            self._call(func, arg)
+
+    def _call(self, func, arg):
+        try:
+            func(arg)
+        except StopSimulation:
+            raise
+        except Exception:
+            # The firmware prints the traceback and keeps running
+            self.callback_errors += 1
+            if self.callback_errors <= 5:
+                traceback.print_exc()
+
+    def advance_to(self, target_us):
+        """Move the clock forward to target_us, firing every timer due on the way."""
+        while self._timers and self._timers[0][0] <= target_us:
+            due_us, _, timer = heapq.heappop(self._timers)
+            if not timer.armed or timer.due_us != due_us:
+                continue
+            self.now_us = max(self.now_us, due_us)
+            self._check_end()
+            timer.fire()
+            self.run_scheduled()
+        self.now_us = max(self.now_us, target_us)
+        self.run_scheduled()
+        self._check_end()
+
+    def advance(self, us):
+        self.advance_to(self.now_us + us)
+
+    def _check_end(self):
+        if self.end_us is not None and self.now_us >= self.end_us:
+            raise StopSimulation()
+
+
+clock = VirtualClock()
+
+# I2C bus id -> I2CBusModel, see devices.py
+i2c_buses = {}
+
+# (ssid, bssid, channel, rssi, security, hidden) tuples returned by WLAN.scan()
+wlan_networks = []
+# ssid -> password accepted by WLAN.connect()
+wlan_passwords = {}
+
+# Loopback MQTT broker reachable through usocket, see devices.MQTTBroker
+mqtt_broker = None
+
+# url -> response text for urequests.get()
+http_routes = {}
+
+# Every NeoPixel object created, so the runner can report on the ring
+neopixels = []
+
+# Pin number -> last value written, e.g. the WS_PWR_PIN power switch
+pin_values = {}
+
+# gc.collect() calls made by the firmware
+gc_collects = 0
@@ -0,0 +1,22 @@
+"""Simulated bluetooth module: BLE accepts advertising calls and records the payloads."""
+
+
+class BLE:
+    def __init__(self):
+        self._active = False
+        self._irq = None
+        self.advertisements = []
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def irq(self, handler):
+        self._irq = handler
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        self.advertisements.append(bytes(adv_data or b""))
+
+    def config(self, *args, **kwargs):
+        return None
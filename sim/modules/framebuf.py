@@ -0,0 +1,74 @@
+"""Simulated framebuf with the pixel formats the firmware uses (MONO_HLSB, MONO_VLSB, MONO_HMSB)."""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        self.buf = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = stride if stride is not None else width
+        if format == MONO_VLSB:
+            needed = ((height + 7) // 8) * self.stride
+        elif format in (MONO_HLSB, MONO_HMSB):
+            needed = ((self.stride + 7) // 8) * height
+        else:
+            raise ValueError("invalid format")
+        if len(buffer) < needed:
+            raise ValueError("buffer too small")
+
+    def _locate(self, x, y):
+        if self.format == MONO_VLSB:
+            return (y >> 3) * self.stride + x, y & 7
+        index = (y * ((self.stride + 7) & ~7) + x) >> 3
+        if self.format == MONO_HLSB:
+            return index, 7 - (x & 7)
+        return index, x & 7
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None if c is None else None
+        index, bit = self._locate(x, y)
+        if c is None:
+            return (self.buf[index] >> bit) & 1
+        if c:
+            self.buf[index] |= 1 << bit
+        else:
+            self.buf[index] &= ~(1 << bit) & 0xFF
+
+    def fill(self, c):
+        value = 0xFF if c else 0
+        for i in range(len(self.buf)):
+            self.buf[i] = value
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self.height)):
+            for xx in range(max(x, 0), min(x + w, self.width)):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def scroll(self, xstep, ystep):
+        pixels = [[self.pixel(x, y) for x in range(self.width)] for y in range(self.height)]
+        for y in range(self.height):
+            for x in range(self.width):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < self.width and 0 <= sy < self.height:
+                    self.pixel(x, y, pixels[sy][sx])
@@ -0,0 +1,132 @@
+"""Simulated machine module: Pin, I2C, Timer and the few CPU functions main.py calls."""
+import hal
+
+DEEPSLEEP_RESET = 4
+PWRON_RESET = 1
+
+_freq = 160000000
+
+
+def freq(hz=None):
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+
+
+def reset_cause():
+    return PWRON_RESET
+
+
+def deepsleep(ms=0):
+    raise hal.StopSimulation()
+
+
+def reset():
+    raise hal.StopSimulation()
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x32"
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._irq = None
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return hal.pin_values.get(self.id, 0)
+        hal.pin_values[self.id] = 1 if value else 0
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._irq = handler
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+        if id not in hal.i2c_buses:
+            from devices import I2CBusModel
+            hal.i2c_buses[id] = I2CBusModel(freq)
+        self.bus = hal.i2c_buses[id]
+        self.bus.freq = freq
+
+    def scan(self):
+        return sorted(self.bus.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        self.bus.write(addr, buf)
+        return len(buf)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self.bus.write_mem(addr, memaddr, buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return self.bus.read_mem(addr, memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        data = self.bus.read_mem(addr, memaddr, len(buf))
+        buf[:] = data
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self.armed = False
+        self.due_us = None
+        self.period_us = 0
+        self.mode = Timer.PERIODIC
+        self.callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        if freq > 0:
+            self.period_us = int(1000000 / freq)
+        else:
+            self.period_us = int(period) * 1000
+        self.mode = mode
+        self.callback = callback
+        self.armed = True
+        self._arm()
+
+    def _arm(self):
+        self.due_us = hal.clock.now_us + max(self.period_us, 1)
+        hal.clock.add_timer(self, self.due_us)
+
+    def deinit(self):
+        self.armed = False
+
+    def fire(self):
+        hal.clock.timer_fires[self.id] = hal.clock.timer_fires.get(self.id, 0) + 1
+        if self.mode == Timer.PERIODIC:
+            self._arm()
+        else:
+            self.armed = False
+        if self.callback is not None:
+            hal.clock._call(self.callback, self)
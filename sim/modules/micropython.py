@@ -0,0 +1,28 @@
+"""Simulated micropython module."""
+import gc
+
+import hal
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    hal.clock.schedule(func, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=None):
+    print("mem: total={} free={}".format(gc.mem_alloc() + gc.mem_free(), gc.mem_free()))
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
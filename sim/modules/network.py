@@ -0,0 +1,79 @@
+"""Simulated network module: a station interface that scans hal.wlan_networks.
+
+Includes the non-blocking scan calls from the badge's custom firmware.
+"""
+import hal
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+
+
+class WLAN:
+    def __init__(self, interface_id=STA_IF):
+        self.interface_id = interface_id
+        self._active = False
+        self._ssid = None
+        self._status = STAT_IDLE
+        self._scan_results = None
+        self._scan_done_us = 0
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._ssid = None
+            self._status = STAT_IDLE
+
+    def scan(self):
+        return list(hal.wlan_networks)
+
+    # Custom firmware: start a scan and poll for completion
+    def scan_non_blocking(self, blocking=False):
+        self._scan_results = list(hal.wlan_networks)
+        self._scan_done_us = hal.clock.now_us + 1500000
+
+    def in_progress(self):
+        return hal.clock.now_us < self._scan_done_us
+
+    def results(self):
+        return self._scan_results or []
+
+    def connect(self, ssid=None, key=None):
+        known = [net[0].decode() for net in hal.wlan_networks]
+        if ssid not in known:
+            self._status = STAT_NO_AP_FOUND
+        elif hal.wlan_passwords.get(ssid) not in (None, key):
+            self._status = STAT_WRONG_PASSWORD
+        else:
+            self._ssid = ssid
+            self._status = STAT_GOT_IP
+
+    def disconnect(self):
+        self._ssid = None
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        return self._active and self._status == STAT_GOT_IP
+
+    def status(self, param=None):
+        if param == "rssi":
+            for net in hal.wlan_networks:
+                if net[0].decode() == self._ssid:
+                    return net[3]
+            return -100
+        return self._status
+
+    def ifconfig(self, config=None):
+        return ("10.0.0.32", "255.255.255.0", "10.0.0.1", "10.0.0.1")
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return b"\x24\x0a\xc4\x00\x00\x32"
+        return None
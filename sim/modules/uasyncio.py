@@ -0,0 +1,88 @@
+"""Simulated uasyncio: a single-threaded scheduler running on the virtual clock.
+
+Sleeping advances hal.clock instead of waiting, so a simulated minute takes as
+long as the work done in it. Timers fire while the clock moves between wakeups.
+"""
+import heapq
+
+import hal
+
+
+class _Sleep:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __await__(self):
+        yield self.ms
+
+
+def sleep_ms(ms):
+    return _Sleep(max(0, int(ms)))
+
+
+def sleep(seconds):
+    return _Sleep(max(0, int(seconds * 1000)))
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+
+    def __await__(self):
+        while not self.done:
+            yield 1
+        return self.result
+
+    def cancel(self):
+        self.done = True
+
+
+_queue = []
+_seq = 0
+
+
+def _push(task, wake_us):
+    global _seq
+    _seq += 1
+    heapq.heappush(_queue, (wake_us, _seq, task))
+
+
+def create_task(coro):
+    task = Task(coro)
+    _push(task, hal.clock.now_us)
+    return task
+
+
+def run(coro):
+    main = create_task(coro)
+    while _queue and not main.done:
+        wake_us, _, task = heapq.heappop(_queue)
+        if task.done:
+            continue
+        hal.clock.advance_to(wake_us)
+        try:
+            ms = task.coro.send(None)
+        except StopIteration as stop:
+            task.done = True
+            task.result = stop.value
+            continue
+        _push(task, hal.clock.now_us + max(int(ms or 0), 0) * 1000 + (0 if ms else 100))
+    return main.result
+
+
+def get_event_loop():
+    return _Loop()
+
+
+class _Loop:
+    def create_task(self, coro):
+        return create_task(coro)
+
+    def run_until_complete(self, coro):
+        return run(coro)
+
+    def run_forever(self):
+        while True:
+            hal.clock.advance(1000)
@@ -0,0 +1,2 @@
+"""Simulated ubinascii: the CPython binascii module."""
+from binascii import *  # noqa: F401,F403
@@ -0,0 +1,2 @@
+"""Simulated uerrno: the CPython errno module."""
+from errno import *  # noqa: F401,F403
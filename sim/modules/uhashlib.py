@@ -0,0 +1,2 @@
+"""Simulated uhashlib: the CPython hashlib constructors."""
+from hashlib import sha1, sha256  # noqa: F401
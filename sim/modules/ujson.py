@@ -0,0 +1,2 @@
+"""Simulated ujson: the CPython json module."""
+from json import *  # noqa: F401,F403
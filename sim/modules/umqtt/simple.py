@@ -0,0 +1,2 @@
+"""Simulated umqtt.simple: the badge's own client from lib/custom_mqtt.py over the loopback socket."""
+from lib.custom_mqtt import MQTTClient, MQTTException  # noqa: F401
@@ -0,0 +1,2 @@
+"""Simulated uos: the CPython os module."""
+from os import *  # noqa: F401,F403
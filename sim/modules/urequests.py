@@ -0,0 +1,22 @@
+"""Simulated urequests: GET returns the text registered in hal.http_routes."""
+import hal
+
+
+class Response:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+
+    def json(self):
+        import json
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+
+def get(url, **kwargs):
+    if url in hal.http_routes:
+        return Response(200, hal.http_routes[url])
+    return Response(404, "")
@@ -0,0 +1,68 @@
+"""Simulated usocket: every connection is a loopback to hal.mqtt_broker.
+
+Reads never block; with no data waiting a non-blocking read returns None like
+the badge's sockets, and a blocking read raises ETIMEDOUT instead of hanging
+the simulation.
+"""
+import errno
+
+import hal
+
+AF_INET = 2
+SOCK_STREAM = 1
+SOL_SOCKET = 1
+SO_REUSEADDR = 4
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    if isinstance(host, bytes):
+        host = host.decode()
+    return [(AF_INET, SOCK_STREAM, 0, "", (host, port))]
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0):
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        self.blocking = True
+        self.connected = False
+
+    def connect(self, addr):
+        if hal.mqtt_broker is None:
+            raise OSError(errno.ECONNREFUSED, "ECONNREFUSED")
+        hal.mqtt_broker.connect(self)
+        self.connected = True
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def settimeout(self, value):
+        self.blocking = value is None or value > 0
+
+    def write(self, buf, length=None):
+        if isinstance(buf, str):
+            buf = buf.encode()  # MicroPython sockets take str as well
+        data = bytes(buf) if length is None else bytes(buf)[:length]
+        self.outbound += data
+        hal.mqtt_broker.handle(self)
+        return len(data)
+
+    send = write
+
+    def read(self, n=-1):
+        if not self.inbound:
+            if self.blocking:
+                raise OSError(errno.ETIMEDOUT, "ETIMEDOUT")
+            return None
+        if n < 0:
+            n = len(self.inbound)
+        data = bytes(self.inbound[:n])
+        del self.inbound[:n]
+        return data
+
+    recv = read
+
+    def close(self):
+        self.connected = False
+        if hal.mqtt_broker is not None and self in hal.mqtt_broker.connections:
+            hal.mqtt_broker.connections.remove(self)
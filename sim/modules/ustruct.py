@@ -0,0 +1,2 @@
+"""Simulated ustruct: the CPython struct module."""
+from struct import *  # noqa: F401,F403
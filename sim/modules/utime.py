@@ -0,0 +1,44 @@
+"""Simulated utime: the virtual clock's ticks and sleeps, see hal.VirtualClock."""
+import time as _time
+
+import hal
+
+
+def ticks_ms():
+    return hal.clock.ticks_ms()
+
+
+def ticks_us():
+    return hal.clock.ticks_us()
+
+
+def ticks_cpu():
+    return hal.clock.ticks_us()
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def sleep_ms(ms):
+    hal.clock.advance(int(ms) * 1000)
+
+
+def sleep_us(us):
+    hal.clock.advance(int(us))
+
+
+def sleep(seconds):
+    hal.clock.advance(int(seconds * 1000000))
+
+
+def time():
+    return 757382400 + hal.clock.ticks_ms() // 1000  # 2024-01-01 in the MicroPython epoch
+
+
+def localtime(secs=None):
+    return _time.gmtime(secs if secs is not None else time() + 946684800)[:8]
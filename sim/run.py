@@ -0,0 +1,193 @@
+"""
+Boot the badge firmware (iwp/main.py) on Linux under CPython.
+
+The MicroPython-only modules are replaced by the stand-ins in sim/modules: a
+virtual clock drives machine.Timer and uasyncio, I2C bus 0 carries register
+models of the IS31FL3729, LIS2DW12 and LTR-308ALS, NeoPixel writes go to a
+buffer, WLAN scans return a fake network list and MQTT talks to a loopback
+broker. Time only passes when the firmware sleeps, so runs are deterministic
+and as fast as the work in them.
+
+Usage, from the repository root:
+    python3 sim/run.py --seconds 10
+    python3 sim/run.py --seconds 20 --wifi --banner "HELLO DEF CON" --banner-at 8
+    python3 sim/run.py --seconds 30 --flip 5
+    python3 sim/run.py --seconds 15 --ring sparkle --bpm 120
+    python3 sim/run.py --seconds 5 --flash /tmp/badge   # Twice: the second boot finds the frame cache
+
+At the end it prints display and ring frame rates, I2C traffic per device, heap
+usage (tracemalloc) and the final matrix picture.
+"""
+import argparse
+import builtins
+import gc
+import os
+import runpy
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+IWP_DIR = os.path.join(os.path.dirname(SIM_DIR), "iwp")
+
+SIM_SSID = "SimNet"
+SIM_PASSWORD = "hunter22"
+
+
+def install():
+    """Put the stand-in modules in front of the firmware and attach the device models.
+
+    Returns the hal module so callers can drive the simulation.
+    """
+    for path in (IWP_DIR, SIM_DIR, os.path.join(SIM_DIR, "modules")):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+
+    import hal
+    import utime
+    from devices import I2CBusModel, IS31FL3729Model, LIS2DW12Model, LTR308Model
+
+    # MicroPython builtins and the time/gc extensions the firmware uses
+    builtins.const = lambda value: value
+    for name in ("ticks_ms", "ticks_us", "ticks_cpu", "ticks_diff", "ticks_add", "sleep_ms", "sleep_us", "sleep"):
+        setattr(time, name, getattr(utime, name))
+
+    def collect():
+        hal.gc_collects += 1
+        return 0
+
+    def mem_alloc():
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    gc.collect = collect
+    gc.mem_alloc = mem_alloc
+    # CPython's own heap (megabytes of code objects) says nothing about the
+    # badge's, so report roughly what the ESP32 build has free
+    gc.mem_free = lambda: 110 * 1024
+    gc.threshold = lambda amount=None: -1
+
+    bus = hal.i2c_buses.setdefault(0, I2CBusModel())
+    bus.attach(IS31FL3729Model())
+    bus.attach(LIS2DW12Model())
+    bus.attach(LTR308Model())
+    return hal
+
+
+def enable_wireless(hal):
+    """Configure WiFi and MQTT so main() connects to the fake network and loopback broker."""
+    from devices import MQTTBroker
+    import CONFIG.WIFI_CONFIG as wifi_config
+    import CONFIG.MQTT_CONFIG as mqtt_config
+
+    hal.wlan_networks[:] = [
+        (SIM_SSID.encode(), b"\x02\x00\x00\x00\x00\x01", 6, -48, 3, False),
+        (b"DEFCON-open", b"\x02\x00\x00\x00\x00\x02", 1, -71, 0, False),
+        (b"totally-not-a-pineapple", b"\x02\x00\x00\x00\x00\x03", 11, -80, 0, False),
+    ]
+    hal.wlan_passwords[SIM_SSID] = SIM_PASSWORD
+    hal.mqtt_broker = MQTTBroker()
+    wifi_config.WIFI_LIST = [[SIM_SSID, SIM_PASSWORD]]
+    mqtt_config.MQTT_USERNAME = b"sim"
+    mqtt_config.MQTT_PASSWORD = b"sim"
+    mqtt_config.MQTT_SERVER = b"localhost"
+    mqtt_config.MQTT_CLIENT_ID = "sim-badge"
+
+
+def at(hal, seconds, action):
+    """Run action once the virtual clock reaches seconds."""
+    import machine
+
+    timer = machine.Timer(-1)
+    timer.init(mode=machine.Timer.ONE_SHOT, period=int(seconds * 1000), callback=lambda t: action())
+    return timer
+
+
+def report(hal, seconds):
+    from src.matrix_functions.matrix_layout import LED_MATRIX_MAP, ROWS, COLS
+
+    bus = hal.i2c_buses[0]
+    matrix = bus.devices[0x34]
+    elapsed = max(hal.clock.now_us / 1000000, 1e-9)
+    print()
+    print("Simulated {:.1f} s".format(elapsed))
+    print("Display timer ticks: {} ({:.1f}/s)".format(hal.clock.timer_fires.get(2, 0), hal.clock.timer_fires.get(2, 0) / elapsed))
+    print("Matrix frames flushed: {} ({:.1f} fps)".format(matrix.frames, matrix.frames / elapsed))
+    for strip in hal.neopixels:
+        print("Ring writes: {} ({:.1f} fps)".format(strip.writes, strip.writes / elapsed))
+    print("I2C traffic:")
+    for address, (transactions, nbytes) in sorted(bus.traffic.items()):
+        name = bus.devices[address].name if address in bus.devices else hex(address)
+        print("  {:<11} 0x{:02x}: {:>7} transactions {:>9} bytes {:>8.0f} B/s  {:.2f}% busy".format(
+            name, address, transactions, nbytes, nbytes / elapsed,
+            100 * bus.bus_time_us(nbytes) / (elapsed * 1000000)))
+    current, peak = tracemalloc.get_traced_memory()
+    print("Heap: {} bytes in use, {} bytes peak".format(current, peak))
+    print("gc.collect() calls: {} ({:.0f}/s)".format(hal.gc_collects, hal.gc_collects / elapsed))
+    if hal.clock.callback_errors:
+        print("Timer callback errors: {}".format(hal.clock.callback_errors))
+    print("Matrix (global current {}/64):".format(matrix.global_current))
+    print(matrix.render(LED_MATRIX_MAP, ROWS, COLS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10, help="virtual time to run for")
+    parser.add_argument("--wifi", action="store_true", help="join a fake network and connect to the loopback MQTT broker")
+    parser.add_argument("--banner", help="publish this text on the banner topic (implies --wifi)")
+    parser.add_argument("--banner-at", type=float, default=8, help="when to publish the banner, in seconds")
+    parser.add_argument("--bpm", type=int, help="publish this on the bpm topic at --banner-at (implies --wifi)")
+    parser.add_argument("--ring", help="publish this ring effect name on the ring topic at --banner-at (implies --wifi)")
+    parser.add_argument("--flip", type=float, help="turn the badge upside down at this time, in seconds")
+    parser.add_argument("--lux", type=float, help="ambient light the LTR-308ALS reports")
+    parser.add_argument("--flash", help="directory standing in for the badge filesystem, reuse it to boot with files "
+                        "an earlier run wrote (default: a new temporary directory)")
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    hal = install()
+    hal.clock.end_us = int(args.seconds * 1000000)
+
+    # Count a matrix frame for every display tick that wrote PWM registers
+    matrix = hal.i2c_buses[0].devices[0x34]
+    matrix.frames = 0
+    matrix_write = matrix.write
+    last_frame_us = [-1]
+
+    def counting_write(reg, data):
+        if reg < 0x90 and hal.clock.now_us != last_frame_us[0]:
+            last_frame_us[0] = hal.clock.now_us
+            matrix.frames += 1
+        matrix_write(reg, data)
+
+    matrix.write = counting_write
+
+    if args.wifi or args.banner or args.bpm or args.ring:
+        enable_wireless(hal)
+    if args.lux is not None:
+        hal.i2c_buses[0].devices[0x53].set_lux(args.lux)
+    if args.banner:
+        at(hal, args.banner_at, lambda: hal.mqtt_broker.publish("banner", args.banner))
+    if args.bpm:
+        at(hal, args.banner_at, lambda: hal.mqtt_broker.publish("bpm", str(args.bpm)))
+    if args.ring:
+        at(hal, args.banner_at, lambda: hal.mqtt_broker.publish("ring", args.ring))
+    if args.flip is not None:
+        at(hal, args.flip, lambda: hal.i2c_buses[0].devices[0x19].set_acceleration(0, 0, -1000))
+
+    cwd = os.getcwd()
+    flash = args.flash or tempfile.mkdtemp(prefix="iwp-flash-")
+    os.makedirs(flash, exist_ok=True)
+    os.chdir(flash)
+    try:
+        runpy.run_path(os.path.join(IWP_DIR, "main.py"), run_name="__main__")
+    except hal.StopSimulation:
+        pass
+    finally:
+        os.chdir(cwd)
+    report(hal, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
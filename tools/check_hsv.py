@@ -0,0 +1,72 @@
+"""
+Check the integer HSV kernel (helpers.hsv_fill) against the float hsv_to_rgb.
+
+Every hue (0-1535), saturation (0-255) and value (0-255) is converted both
+ways and each channel compared; the check fails if any differs by more than
+--tolerance (default 1). The float version truncates 255 * x, and floats just
+under a whole number truncate one lower, so off-by-one is expected and larger
+differences are not. The integer side is run one saturation/value pair at a
+time, all 1536 hues in one hsv_fill call, which also covers the stepping.
+
+Takes a few minutes under CPython; --step N checks every Nth saturation and
+value for a quick run.
+
+Usage, from the repository root:
+    python3 tools/check_hsv.py
+    python3 tools/check_hsv.py --step 15
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "iwp"))
+
+from src.helpers import HUE_RANGE, hsv_fill, hsv_to_rgb, hsv_to_rgb_into
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the integer HSV kernel with the float one.")
+    parser.add_argument("--step", type=int, default=1, help="check every Nth saturation and value")
+    parser.add_argument("--tolerance", type=int, default=1, help="largest allowed difference per channel")
+    args = parser.parse_args(argv)
+
+    levels = list(range(0, 256, args.step))
+    if levels[-1] != 255:
+        levels.append(255)
+    buf = bytearray(HUE_RANGE * 3)
+    one = bytearray(3)
+    worst = 0
+    off_by_one = 0
+    checked = 0
+    failures = []
+    for sat in levels:
+        s = sat / 255
+        for val in levels:
+            v = val / 255
+            hsv_fill(buf, 0, HUE_RANGE, 0, 1, sat, val)
+            for hue in range(HUE_RANGE):
+                expected = hsv_to_rgb(hue / HUE_RANGE, s, v)
+                i = hue * 3
+                for channel in range(3):
+                    diff = abs(buf[i + channel] - expected[channel])
+                    if diff:
+                        off_by_one += diff == 1
+                        if diff > worst:
+                            worst = diff
+                        if diff > args.tolerance and len(failures) < 10:
+                            failures.append((hue, sat, val, tuple(buf[i:i + 3]), expected))
+                checked += 1
+        # The single pixel entry point and the wrap at the end of the wheel
+        hsv_to_rgb_into(one, 0, HUE_RANGE + 7, sat, 255)
+        hsv_fill(buf, 0, 1, 7, 0, sat, 255)
+        if one != buf[:3]:
+            failures.append(("wrap", sat, 255, tuple(one), tuple(buf[:3])))
+
+    print("{} colours checked, {} channels off by one, largest difference {}".format(checked, off_by_one, worst))
+    for failure in failures:
+        print("mismatch: hue {} sat {} val {}: int {} float {}".format(*failure))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
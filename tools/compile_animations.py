@@ -0,0 +1,211 @@
+"""
+Compile matrix animations into .anim files on the host, before flashing.
+
+Sources are the AnimationManager animations (jump_man, wave, cat, flashy,
+heart) and ASCII art files. Every frame is checked against the real matrix: 7
+rows of 6 LEDs, where rows 0 and 1 may have a 7th entry for the green and red
+LEDs at (0, 6) and (1, 6). Rows that are short are padded with off LEDs and
+trailing off entries past the last LED are dropped, with a warning; a lit entry
+where there is no LED is an error. The frames are then written with
+src.animation_file.write_animation, which stores repeated frames once, and the
+badge plays the result with AnimationFileSource without parsing anything.
+
+ASCII art files hold one or more frames, each starting with a "frame <ms>" line
+followed by 7 rows. "#", "X" and "1" are lit, "." and "0" are off. Any other
+hex digit makes it a greyscale animation, where digits are levels 0-15 and
+"#" and "X" are 15.
+Blank lines and lines starting with ";" are ignored:
+
+    ; heart.txt
+    frame 2000
+    .#..#.#
+    #.##.#.
+    #....#
+    #....#
+    #....#
+    .#..#.
+    ..##..
+
+Usage, from the repository root:
+    python3 tools/compile_animations.py
+    python3 tools/compile_animations.py --out build/anim --max-bytes 4096 art/*.txt
+
+Exits 1 if a frame is invalid or a file is over --max-bytes. Copy the output
+to /anim on the badge and publish its path on the "animation" topic.
+"""
+import argparse
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOLS_DIR)
+# The firmware modules, and the sim stand-ins for the MicroPython ones they import
+sys.path.insert(0, os.path.join(ROOT_DIR, "sim", "modules"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "iwp"))
+
+from src.animation_file import HEADER_SIZE, ENTRY_SIZE, write_animation
+from src.animations import AnimationManager
+from src.frame_store import FRAME_BYTES, GREY_FRAME_BYTES, GREY_LEVELS, pack_grey
+from src.matrix_functions.matrix_layout import ROWS, COLS
+
+# Rows with an extra LED in column COLS, see matrix_layout
+EXTRA_ROWS = 2
+ON_CHARS = "#X"
+OFF_CHARS = ". "
+
+
+class AnimationError(ValueError):
+    pass
+
+
+def normalize_frame(frame, where, warnings):
+    """Check a frame of rows against the matrix and return its LED levels by LED index.
+
+    Args:
+        frame: ROWS rows of levels (0/1, or 0-15 for greyscale).
+        where (str): Name and frame number for messages.
+        warnings (list): Messages about rows that were padded or trimmed.
+
+    Returns:
+        bytearray: Level of LED x * COLS + y, then the extra LEDs.
+
+    Raises:
+        AnimationError: Wrong number of rows, a bad level, or a lit LED that
+            does not exist.
+    """
+    if len(frame) != ROWS:
+        raise AnimationError("{}: {} rows, the matrix has {}".format(where, len(frame), ROWS))
+    levels = bytearray(ROWS * COLS + EXTRA_ROWS)
+    for x, row in enumerate(frame):
+        width = COLS + 1 if x < EXTRA_ROWS else COLS
+        for y, level in enumerate(row):
+            if not isinstance(level, int) or not 0 <= level < GREY_LEVELS:
+                raise AnimationError("{}: row {} col {} is {!r}".format(where, x, y, level))
+            if y >= width:
+                if level:
+                    raise AnimationError("{}: row {} col {} is lit but there is no LED there".format(where, x, y))
+                continue
+            levels[x * COLS + y if y < COLS else ROWS * COLS + x] = level
+        if len(row) < COLS:
+            warnings.append("{}: row {} has {} entries, padded to {}".format(where, x, len(row), COLS))
+        elif len(row) > width:
+            warnings.append("{}: row {} has {} entries, trimmed to {}".format(where, x, len(row), width))
+    return levels
+
+
+def parse_ascii_art(path):
+    """Read an ASCII art file into (rows, delay ms) frames."""
+    frames = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip()
+            if not line or line.startswith(";"):
+                continue
+            if line.startswith("frame"):
+                try:
+                    delay = int(line.split()[1])
+                except (IndexError, ValueError):
+                    raise AnimationError("{}:{}: expected 'frame <ms>'".format(path, number))
+                frames.append(([], delay))
+                continue
+            if not frames:
+                raise AnimationError("{}:{}: rows before the first 'frame' line".format(path, number))
+            row = []
+            for char in line:
+                if char in ON_CHARS:
+                    row.append(GREY_LEVELS - 1)
+                elif char in OFF_CHARS:
+                    row.append(0)
+                else:
+                    try:
+                        row.append(int(char, 16))
+                    except ValueError:
+                        raise AnimationError("{}:{}: unexpected {!r}".format(path, number, char))
+            frames[-1][0].append(row)
+    return frames
+
+
+def compile_frames(name, frames, grey=False):
+    """Validate frames and turn them into what write_animation takes.
+
+    Args:
+        name (str): Animation name for messages.
+        frames: (rows, delay) pairs.
+        grey (bool): Keep levels 0-15, otherwise any lit level is on.
+
+    Returns:
+        Tuple[list, int, list]: (frame, delay) pairs, the frame size and warnings.
+    """
+    warnings = []
+    compiled = []
+    for i, (rows, delay) in enumerate(frames):
+        levels = normalize_frame(rows, "{} frame {}".format(name, i), warnings)
+        if grey:
+            compiled.append((pack_grey(levels), delay))
+        else:
+            frame = 0
+            for index, level in enumerate(levels):
+                if level:
+                    frame |= 1 << index
+            compiled.append((frame, delay))
+    return compiled, GREY_FRAME_BYTES if grey else FRAME_BYTES, warnings
+
+
+def manager_sources():
+    """The AnimationManager animations, as (name, frames, grey)."""
+    manager = AnimationManager()
+    for name in sorted(manager.animations):
+        yield name, manager.animations[name](), False
+
+
+def art_sources(paths):
+    for path in paths:
+        frames = parse_ascii_art(path)
+        # The ASCII art mono values are 1 and 15, anything else means greyscale
+        grey = any(level not in (0, 1, GREY_LEVELS - 1) for rows, _ in frames for row in rows for level in row)
+        if not grey:
+            frames = [([[1 if level else 0 for level in row] for row in rows], delay) for rows, delay in frames]
+        yield os.path.splitext(os.path.basename(path))[0], frames, grey
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile matrix animations into .anim files.")
+    parser.add_argument("art", nargs="*", help="ASCII art files to compile as well")
+    parser.add_argument("--out", default=os.path.join("build", "anim"), help="output directory (default build/anim)")
+    parser.add_argument("--max-bytes", type=int, default=0, help="fail if a file is bigger than this")
+    parser.add_argument("--no-builtin", action="store_true", help="skip the AnimationManager animations")
+    args = parser.parse_args(argv)
+
+    sources = []
+    if not args.no_builtin:
+        sources.extend(manager_sources())
+    failed = False
+    try:
+        sources.extend(art_sources(args.art))
+    except (OSError, AnimationError) as e:
+        print("error: {}".format(e))
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    print("{:<16} {:>6} {:>6} {:>5} {:>7}".format("animation", "steps", "unique", "kind", "bytes"))
+    for name, frames, grey in sources:
+        try:
+            compiled, frame_bytes, warnings = compile_frames(name, frames, grey)
+        except AnimationError as e:
+            print("error: {}".format(e))
+            failed = True
+            continue
+        for warning in warnings:
+            print("warning: {}".format(warning))
+        path = os.path.join(args.out, name + ".anim")
+        unique, entries = write_animation(path, compiled, frame_bytes)
+        size = HEADER_SIZE + entries * ENTRY_SIZE + unique * frame_bytes
+        print("{:<16} {:>6} {:>6} {:>5} {:>7}".format(name, entries, unique, "grey" if grey else "mono", size))
+        if args.max_bytes and size > args.max_bytes:
+            print("error: {} is {} bytes, over --max-bytes {}".format(path, size, args.max_bytes))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())